@@ -0,0 +1,370 @@
+"""
+Headless export benchmarks for BlendLuxCore, see benchmarks/readme.md
+
+Usage:
+blender --background --factory-startup --python benchmarks/run_benchmarks.py -- [options]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import addon_utils
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(BENCHMARK_DIR)
+ADDON_NAME = os.path.basename(ADDON_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline_%s.json" % platform.node())
+# Peak memory increases below this are not reported as regressions
+MEMORY_NOISE_MB = 16
+
+sys.path.insert(0, BENCHMARK_DIR)
+import scenes
+
+
+def parse_args():
+    # Blender ignores all arguments after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(prog="run_benchmarks.py")
+    parser.add_argument("-k", "--filter", default="",
+                        help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Run each benchmark this many times, the fastest run is reported")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="JSON file with the results to compare against")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store the results as new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown and memory increase relative to the baseline (0.2 = 20%%)")
+    parser.add_argument("--output", default="",
+                        help="Also write the results to this JSON file")
+    # Internal: run only this benchmark in this process and write its result to --output
+    parser.add_argument("--single", default="", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def enable_addon():
+    addons_dir = os.path.dirname(ADDON_DIR)
+    if addons_dir not in sys.path:
+        sys.path.insert(0, addons_dir)
+    addon_utils.enable(ADDON_NAME, default_set=True)
+
+
+def get_peak_rss_mb():
+    """ Peak resident set size of the process, or None if not available on this platform """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if platform.system() == "Darwin":
+        return peak / 1024**2
+    return peak / 1024
+
+
+def export_scene():
+    """ Run a final render export of the current scene, returns the profiler stage timings """
+    export = importlib.import_module(ADDON_NAME + ".export")
+    exporter = export.Exporter()
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    session = exporter.create_session(depsgraph, view_layer=bpy.context.view_layer)
+    if session is None:
+        raise Exception("Export failed")
+    del session
+    return {name: timing.time for name, timing in exporter.profiler.stages.items()}
+
+
+def bench_instances(instance_count, unique_mesh_count):
+    def setup():
+        scenes.instances(instance_count, unique_mesh_count)
+
+    def run():
+        return export_scene()
+    return setup, run
+
+
+def bench_hair(strand_count):
+    def setup():
+        scenes.hair(strand_count)
+
+    def run():
+        return export_scene()
+    return setup, run
+
+
+def bench_hair_points(strand_count):
+    """ Compares the vectorized hair key interpolation with Blender's path cache """
+    hair = importlib.import_module(ADDON_NAME + ".export.hair")
+    state = {}
+
+    def setup():
+        scenes.hair(strand_count)
+        state["emitter"] = bpy.data.objects["Emitter"]
+
+    def run():
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        emitter = state["emitter"].evaluated_get(depsgraph)
+        psys = emitter.particle_systems[0]
+        points_per_strand = 2 ** psys.settings.render_step + 1
+        strands = len(psys.particles)
+
+        start = perf_counter()
+        points = hair.convert_points(emitter, psys, None, 0, strands, points_per_strand, num_children=0)
+        interpolate_time = perf_counter() - start
+
+        start = perf_counter()
+        reference = hair.read_path_cache(emitter, psys, None, 0, strands, points_per_strand)
+        path_cache_time = perf_counter() - start
+
+        max_error = float(np.abs(points - reference).max())
+        if max_error > 1e-4:
+            raise AssertionError("Interpolated hair points differ from co_hair() by %g" % max_error)
+        return {"interpolate": interpolate_time, "co_hair": path_cache_time}
+    return setup, run
+
+
+def bench_smoke(resolution):
+    smoke = importlib.import_module(ADDON_NAME + ".export.smoke")
+    state = {}
+
+    def setup():
+        scenes.smoke(resolution)
+        state["domain"] = bpy.data.objects["Domain"]
+
+    def run():
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        domain = state["domain"].evaluated_get(depsgraph)
+        start = perf_counter()
+        # A new cache, so the grid is extracted every run
+        smoke.GridCache().get(domain, "density", depsgraph)
+        return {"extract": perf_counter() - start}
+    return setup, run
+
+
+def bench_node_trees(material_count, depth):
+    def setup():
+        scenes.node_trees(material_count, depth)
+
+    def run():
+        return export_scene()
+    return setup, run
+
+
+def bench_mesh_cache(unique_mesh_count):
+    """
+    Exports with an empty mesh cache (cold), with the files on disk but without the index of
+    unchanged meshes, as after restarting Blender (hashed), and with both (warm)
+    """
+    mesh_cache = importlib.import_module(ADDON_NAME + ".export.mesh_cache")
+    state = {}
+
+    def setup():
+        scenes.instances(unique_mesh_count, unique_mesh_count)
+        state["cache_dir"] = tempfile.mkdtemp(prefix="luxcore_bench_mesh_cache_")
+        config = bpy.context.scene.luxcore.config
+        config.use_mesh_cache = True
+        config.mesh_cache_path = state["cache_dir"]
+
+    def run():
+        timings = {}
+        try:
+            mesh_cache.reset()
+            for name in ("cold", "hashed", "warm"):
+                if name == "hashed":
+                    mesh_cache.reset()
+                start = perf_counter()
+                export_scene()
+                timings[name] = perf_counter() - start
+        finally:
+            # The export creates the directory again in the next run
+            shutil.rmtree(state["cache_dir"], ignore_errors=True)
+        return timings
+    return setup, run
+
+
+def bench_matrix_to_list(count):
+    utils = importlib.import_module(ADDON_NAME + ".utils")
+    matrices = [Matrix.Translation((i, 0, 0)) for i in range(count)]
+
+    def run():
+        start = perf_counter()
+        for matrix in matrices:
+            utils.matrix_to_list(matrix)
+        return {"matrix_to_list": perf_counter() - start}
+    return None, run
+
+
+def bench_matrices_to_array(count):
+    utils = importlib.import_module(ADDON_NAME + ".utils")
+    matrices = [Matrix.Translation((i, 0, 0)) for i in range(count)]
+
+    def run():
+        start = perf_counter()
+        utils.matrices_to_array(matrices)
+        return {"matrices_to_array": perf_counter() - start}
+    return None, run
+
+
+def bench_get_props(count):
+    exported_data = importlib.import_module(ADDON_NAME + ".export.caches.exported_data")
+    objects = [exported_data.ExportedObject("obj%d" % i, [["shape%d" % i, 0]], ["mat"],
+                                            Matrix.Translation((i, 0, 0)), True, i)
+               for i in range(count)]
+
+    def run():
+        start = perf_counter()
+        for exported_obj in objects:
+            exported_obj.get_props()
+        return {"get_props": perf_counter() - start}
+    return None, run
+
+
+BENCHMARKS = [
+    ("instances_10k_1mesh", bench_instances, (10000, 1)),
+    ("instances_10k_100meshes", bench_instances, (10000, 100)),
+    ("unique_meshes_1k", bench_instances, (1000, 1000)),
+    ("hair_100k_strands", bench_hair, (100000,)),
+    ("hair_points_10k", bench_hair_points, (10000,)),
+    ("smoke_128", bench_smoke, (128,)),
+    ("node_trees_100x50", bench_node_trees, (100, 50)),
+    ("mesh_cache_1k", bench_mesh_cache, (1000,)),
+    ("matrix_to_list_100k", bench_matrix_to_list, (100000,)),
+    ("matrices_to_array_100k", bench_matrices_to_array, (100000,)),
+    ("get_props_100k", bench_get_props, (100000,)),
+]
+
+
+def run_benchmark(name, factory, args, repeat):
+    setup, run = factory(*args)
+    rss_before = get_peak_rss_mb()
+    if setup:
+        setup()
+
+    best_time = float("inf")
+    best_stages = {}
+    for _ in range(repeat):
+        start = perf_counter()
+        stages = run()
+        elapsed = perf_counter() - start
+        if elapsed < best_time:
+            best_time = elapsed
+            best_stages = stages
+
+    rss_after = get_peak_rss_mb()
+    result = {"time": best_time, "stages": best_stages}
+    if rss_after is not None:
+        result["peak_rss_mb"] = rss_after
+        # The peak is the one of the whole process, which only runs this benchmark,
+        # so this is the additional memory it needed (on top of Blender and the addon)
+        result["peak_rss_increase_mb"] = rss_after - rss_before
+    return result
+
+
+def run_in_subprocess(name, repeat):
+    """
+    Run one benchmark in a new Blender process. The peak RSS can't be reset within a process,
+    so otherwise the memory of a benchmark would be hidden by a larger peak of an earlier one.
+    """
+    fd, output_path = tempfile.mkstemp(prefix="luxcore_benchmark_", suffix=".json")
+    os.close(fd)
+    try:
+        # Without --python-exit-code, Blender exits with 0 even if the script raised an exception
+        command = [bpy.app.binary_path, "--background", "--factory-startup", "--python-exit-code", "1",
+                   "--python", os.path.abspath(__file__),
+                   "--", "--single", name, "--repeat", str(repeat), "--output", output_path]
+        if subprocess.call(command) != 0:
+            raise Exception("Benchmark %s failed" % name)
+        with open(output_path) as f:
+            return json.load(f)[name]
+    finally:
+        os.remove(output_path)
+
+
+def compare(results, baseline, tolerance):
+    """ Returns the names of the benchmarks that are slower or need more memory than the baseline allows """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print("%-28s %8.3f s  (no baseline)" % (name, result["time"]))
+            continue
+
+        baseline_time = baseline[name]["time"]
+        ratio = result["time"] / baseline_time if baseline_time > 0 else 1
+        status = "OK"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        print("%-28s %8.3f s  baseline %8.3f s  (%+.1f%%) %s"
+              % (name, result["time"], baseline_time, (ratio - 1) * 100, status))
+
+        # Memory is compared by the increase of the peak RSS, the absolute peak includes Blender itself
+        memory = result.get("peak_rss_increase_mb")
+        baseline_memory = baseline[name].get("peak_rss_increase_mb")
+        if memory is None or baseline_memory is None:
+            continue
+        # Small increases are noise, e.g. from the allocator
+        allowed_memory = max(baseline_memory * (1 + tolerance), baseline_memory + MEMORY_NOISE_MB)
+        status = "OK"
+        if memory > allowed_memory:
+            status = "REGRESSION"
+            if name not in regressions:
+                regressions.append(name)
+        print("%-28s %8.1f MB baseline %8.1f MB %s" % ("", memory, baseline_memory, status))
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    if args.single:
+        enable_addon()
+        name, factory, factory_args = next(entry for entry in BENCHMARKS if entry[0] == args.single)
+        with open(args.output, "w") as f:
+            json.dump({name: run_benchmark(name, factory, factory_args, args.repeat)}, f)
+        return
+
+    results = {}
+    for name, factory, factory_args in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        print("Running benchmark", name)
+        results[name] = run_in_subprocess(name, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print("Baseline written to", args.baseline)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions compared to baseline:", ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
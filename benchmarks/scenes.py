@@ -0,0 +1,138 @@
+"""
+Generators for synthetic benchmark scenes.
+Each generator clears the current scene and fills it with the requested content.
+"""
+
+import bpy
+import bmesh
+import math
+
+
+def clear_scene():
+    scene = bpy.context.scene
+    for obj in list(scene.collection.all_objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+    for datablocks in (bpy.data.meshes, bpy.data.materials, bpy.data.particles, bpy.data.cameras):
+        for datablock in list(datablocks):
+            datablocks.remove(datablock)
+
+    for node_tree in list(bpy.data.node_groups):
+        bpy.data.node_groups.remove(node_tree)
+
+    scene.render.engine = "LUXCORE"
+    scene.frame_set(1)
+    _add_camera(scene)
+    return scene
+
+
+def _add_camera(scene):
+    camera = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    camera.location = (0, -30, 10)
+    camera.rotation_euler = (math.radians(75), 0, 0)
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+
+
+def _create_icosphere(name, subdivisions):
+    mesh = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    bmesh.ops.create_icosphere(bm, subdivisions=subdivisions, diameter=0.5)
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+
+def _grid_location(index, count, spacing=1.5):
+    side = max(1, math.ceil(math.sqrt(count)))
+    return ((index % side - side / 2) * spacing, (index // side - side / 2) * spacing, 0)
+
+
+def instances(instance_count, unique_mesh_count, subdivisions=3):
+    """ instance_count objects that share unique_mesh_count meshes """
+    scene = clear_scene()
+    meshes = [_create_icosphere("Mesh.%d" % i, subdivisions) for i in range(unique_mesh_count)]
+
+    for i in range(instance_count):
+        obj = bpy.data.objects.new("Instance.%d" % i, meshes[i % unique_mesh_count])
+        obj.location = _grid_location(i, instance_count)
+        scene.collection.objects.link(obj)
+    return scene
+
+
+def hair(strand_count, render_step=3):
+    """ A plane with a hair particle system with strand_count strands """
+    scene = clear_scene()
+    mesh = bpy.data.meshes.new("Emitter")
+    bm = bmesh.new()
+    bmesh.ops.create_grid(bm, x_segments=10, y_segments=10, size=5)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    emitter = bpy.data.objects.new("Emitter", mesh)
+    scene.collection.objects.link(emitter)
+
+    emitter.modifiers.new("Hair", "PARTICLE_SYSTEM")
+    settings = emitter.particle_systems[0].settings
+    settings.type = "HAIR"
+    settings.count = strand_count
+    settings.hair_length = 0.5
+    settings.render_step = render_step
+    return scene
+
+
+def smoke(resolution, simulated_frames=3):
+    """ A smoke domain with resolution^3 cells, simulated for a few frames """
+    scene = clear_scene()
+
+    domain_mesh = bpy.data.meshes.new("Domain")
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=4)
+    bm.to_mesh(domain_mesh)
+    bm.free()
+    domain = bpy.data.objects.new("Domain", domain_mesh)
+    scene.collection.objects.link(domain)
+
+    mod = domain.modifiers.new("Smoke", "SMOKE")
+    mod.smoke_type = "DOMAIN"
+    mod.domain_settings.resolution_max = resolution
+
+    flow = bpy.data.objects.new("Flow", _create_icosphere("Flow", 2))
+    flow.location = (0, 0, -1)
+    scene.collection.objects.link(flow)
+    mod = flow.modifiers.new("Smoke", "SMOKE")
+    mod.smoke_type = "FLOW"
+
+    # Step through the frames so the simulation creates the grids
+    for frame in range(1, simulated_frames + 1):
+        scene.frame_set(frame)
+    return scene
+
+
+def node_trees(material_count, depth):
+    """ material_count objects, each with a material whose node tree contains a chain of depth math nodes """
+    scene = clear_scene()
+    mesh = _create_icosphere("Mesh", 2)
+
+    for i in range(material_count):
+        node_tree = bpy.data.node_groups.new("Nodes.%d" % i, "luxcore_material_nodes")
+        output = node_tree.nodes.new("LuxCoreNodeMatOutput")
+        matte = node_tree.nodes.new("LuxCoreNodeMatMatte")
+        node_tree.links.new(matte.outputs[0], output.inputs[0])
+
+        socket = matte.inputs["Sigma"]
+        for _ in range(depth):
+            math_node = node_tree.nodes.new("LuxCoreNodeTexMath")
+            math_node.inputs[1].default_value = 0.5
+            node_tree.links.new(math_node.outputs[0], socket)
+            socket = math_node.inputs[0]
+
+        material = bpy.data.materials.new("Material.%d" % i)
+        material.luxcore.node_tree = node_tree
+
+        obj_mesh = mesh.copy()
+        obj_mesh.materials.append(material)
+        obj = bpy.data.objects.new("Object.%d" % i, obj_mesh)
+        obj.location = _grid_location(i, material_count)
+        scene.collection.objects.link(obj)
+    return scene
@@ -5,11 +5,23 @@ import platform
 import numpy
 import subprocess
 import tempfile
+import threading
 from ..bin import pyluxcore
 from .. import utils
 from ..utils import pfm
 
 NULL = 0
+# RAM-backed filesystem, avoids disk I/O when the denoiser images are exchanged
+SHARED_MEMORY_DIR = "/dev/shm"
+
+
+def _get_denoiser_tempdir(required_bytes):
+    """ The shared memory directory is often small (e.g. 64 MB in Docker), so it is only used if the files fit """
+    if os.path.isdir(SHARED_MEMORY_DIR) and os.access(SHARED_MEMORY_DIR, os.W_OK):
+        stats = os.statvfs(SHARED_MEMORY_DIR)
+        if stats.f_bavail * stats.f_frsize >= required_bytes:
+            return SHARED_MEMORY_DIR
+    return tempfile.gettempdir()
 
 
 class TempfileManager:
@@ -39,6 +51,126 @@ class TempfileManager:
         cls._paths.clear()
 
 
+class DenoiserWorker:
+    """
+    Runs the viewport denoiser in a background thread that lives as long as the viewport session.
+    The denoise binary only processes one image per run, so a process is still started per job,
+    but waiting for it and loading its result happens in the background, so the queries from
+    view_draw() never block. Only the most recent job is kept: submitting a new job or cancelling
+    drops the pending one and terminates the running process. cancel() waits until the process
+    has exited, so the input and result files of the next job are not used by two processes.
+    """
+
+    # Seconds to wait for a terminated denoiser process before it is killed
+    TERMINATE_TIMEOUT = 2
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # (job_id, args, result_path) of the job that waits to be started
+        self._job = None
+        # Incremented on every submit() and cancel(), results of older jobs are discarded
+        self._job_id = 0
+        self._process = None
+        # (job_id, data, error) of the last finished job
+        self._result = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, args, result_path):
+        """ Returns the ID of the job, used to query its result """
+        with self._condition:
+            self._job_id += 1
+            self._job = (self._job_id, args, result_path)
+            self._result = None
+            self._terminate_process()
+            self._condition.notify()
+            return self._job_id
+
+    def cancel(self):
+        with self._condition:
+            self._job_id += 1
+            self._job = None
+            self._result = None
+            self._terminate_process()
+
+    def is_done(self, job_id):
+        with self._condition:
+            return self._result is not None and self._result[0] == job_id
+
+    def pop_result(self, job_id):
+        """
+        Returns the denoised image as flat array mapped from the result file,
+        call only if is_done() returned True. Drop it before the file is deleted.
+        """
+        with self._condition:
+            result_job_id, data, error = self._result
+            assert result_job_id == job_id
+            self._result = None
+
+        if error:
+            raise Exception(error)
+        return data
+
+    def shutdown(self):
+        with self._condition:
+            self._running = False
+            self._job = None
+            self._terminate_process()
+            self._condition.notify()
+
+    def _terminate_process(self):
+        if self._process:
+            print("Interrupting denoiser")
+            self._process.terminate()
+            try:
+                self._process.wait(self.TERMINATE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._job is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+                job_id, args, result_path = self._job
+                self._job = None
+                # Started while holding the lock, so cancel() can't miss the process
+                try:
+                    process = subprocess.Popen(args)
+                except OSError as error:
+                    self._result = (job_id, None, "Could not start denoiser: %s" % error)
+                    continue
+                self._process = process
+
+            process.wait()
+
+            with self._condition:
+                if job_id != self._job_id:
+                    # Cancelled or superseded by a newer job
+                    continue
+                self._process = None
+
+            data, error = None, None
+            try:
+                # Mapped, the main thread copies it directly into the frame buffer
+                data, scale = utils.pfm.load_pfm_mmap(result_path, as_flat_list=True)
+            except Exception:
+                # File missing or incomplete
+                error = "Denoising failed, check console for details"
+
+            with self._condition:
+                if job_id == self._job_id:
+                    self._result = (job_id, data, error)
+            # Don't keep the file mapped after the result was dropped
+            del data
+
+
 class FrameBuffer(object):
     """ FrameBuffer used for viewport render """
 
@@ -67,16 +199,17 @@ class FrameBuffer(object):
         self.buffer = bgl.Buffer(bgl.GL_FLOAT, [self._width * self._height * bufferdepth])
         self._init_opengl(engine, scene)
 
-        # Denoiser
-        self._noisy_file_path = self._make_denoiser_filepath("noisy")
-        self._albedo_file_path = self._make_denoiser_filepath("albedo")
-        self._normal_file_path = self._make_denoiser_filepath("normal")
-        self._denoised_file_path = self._make_denoiser_filepath("denoised")
+        # Denoiser, the 3 AOVs and the result are RGB float images
+        denoiser_bytes = 4 * self._width * self._height * 3 * 4
+        self._set_denoiser_tempdir(_get_denoiser_tempdir(denoiser_bytes))
         current_dir = os.path.dirname(os.path.realpath(__file__))
         self._denoiser_path = os.path.join(os.path.dirname(current_dir), "bin", "denoise")
         if platform.system() == "Windows":
             self._denoiser_path += ".exe"
-        self._denoiser_process = None
+        if engine.denoiser_worker is None:
+            engine.denoiser_worker = DenoiserWorker()
+        self._denoiser_worker = engine.denoiser_worker
+        self._denoiser_job_id = None
         self.denoiser_result_cached = False
 
     def _init_opengl(self, engine, scene):
@@ -155,16 +288,29 @@ class FrameBuffer(object):
             return True
         return False
 
-    def _make_denoiser_filepath(self, name):
-        return os.path.join(tempfile.gettempdir(), str(id(self)) + "_" + name + ".pfm")
+    def _set_denoiser_tempdir(self, tempdir):
+        self._noisy_file_path = self._make_denoiser_filepath(tempdir, "noisy")
+        self._albedo_file_path = self._make_denoiser_filepath(tempdir, "albedo")
+        self._normal_file_path = self._make_denoiser_filepath(tempdir, "normal")
+        self._denoised_file_path = self._make_denoiser_filepath(tempdir, "denoised")
+
+    def _make_denoiser_filepath(self, tempdir, name):
+        return os.path.join(tempdir, str(id(self)) + "_" + name + ".pfm")
 
     def _save_denoiser_AOV(self, luxcore_session, film_output_type, path):
         # Bufferdepth always 3 because denoiser can't handle alpha anyway (maybe copy over alpha channel in the future)
-        np_buffer = numpy.zeros((self._height, self._width, 3), dtype="float32")
-        luxcore_session.GetFilm().GetOutputFloat(film_output_type, np_buffer)
         TempfileManager.track(id(self), path)
-        with open(path, "w+b") as f:
-            utils.pfm.save_pfm(f, np_buffer)
+        # The film output is written directly into the mapped file, no intermediate copy
+        np_buffer = utils.pfm.create_pfm_mmap(path, self._width, self._height)
+        luxcore_session.GetFilm().GetOutputFloat(film_output_type, np_buffer)
+        np_buffer.flush()
+        # Unmap the file, it has to be closed before it can be deleted on Windows
+        del np_buffer
+
+    def _save_denoiser_AOVs(self, luxcore_session):
+        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE, self._noisy_file_path)
+        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.ALBEDO, self._albedo_file_path)
+        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.AVG_SHADING_NORMAL, self._normal_file_path)
 
     def start_denoiser(self, luxcore_session):
         if not os.path.exists(self._denoiser_path):
@@ -174,9 +320,17 @@ class FrameBuffer(object):
             # TODO: enable ALPHA AOV and use it in case of transparent film
             raise Exception("Does not work with transparent film yet")
 
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE, self._noisy_file_path)
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.ALBEDO, self._albedo_file_path)
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.AVG_SHADING_NORMAL, self._normal_file_path)
+        # A previous denoiser process might still read the AOV files or write the result file
+        self._denoiser_worker.cancel()
+        try:
+            self._save_denoiser_AOVs(luxcore_session)
+        except OSError:
+            if os.path.dirname(self._noisy_file_path) == tempfile.gettempdir():
+                raise
+            # The shared memory filled up since the directory was chosen
+            TempfileManager.delete_files(id(self))
+            self._set_denoiser_tempdir(tempfile.gettempdir())
+            self._save_denoiser_AOVs(luxcore_session)
         TempfileManager.track(id(self), self._denoised_file_path)
 
         args = [
@@ -186,25 +340,27 @@ class FrameBuffer(object):
             "-nrm", self._normal_file_path,
             "-o", self._denoised_file_path,
         ]
-        self._denoiser_process = subprocess.Popen(args)
+        self._denoiser_job_id = self._denoiser_worker.submit(args, self._denoised_file_path)
 
     def is_denoiser_active(self):
-        return self._denoiser_process is not None
+        return self._denoiser_job_id is not None
 
     def is_denoiser_done(self):
-        return self._denoiser_process.poll() is not None
+        return self._denoiser_worker.is_done(self._denoiser_job_id)
 
     def load_denoiser_result(self, scene):
-        self._denoiser_process = None
+        job_id = self._denoiser_job_id
+        self._denoiser_job_id = None
+        data = None
         try:
-            with open(self._denoised_file_path, "rb") as f:
-                data, scale = utils.pfm.load_pfm(f, as_flat_list=True)
+            data = self._denoiser_worker.pop_result(job_id)
+            # Copied straight from the mapped result file
+            self.buffer[:] = data
+        finally:
+            # Unmap the file, it has to be closed before it can be deleted on Windows
+            data = None
             TempfileManager.delete_files(id(self))
-        except FileNotFoundError:
-            TempfileManager.delete_files(id(self))
-            raise Exception("Denoising failed, check console for details")
 
-        self.buffer[:] = data
         self._update_texture(scene)
         self.denoiser_result_cached = True
 
@@ -212,11 +368,9 @@ class FrameBuffer(object):
         """ Denoiser was not started yet or the user has triggered an update """
         self.denoiser_result_cached = False
 
-        if self._denoiser_process:
-            print("Interrupting denoiser")
-            self._denoiser_process.terminate()
-            self._denoiser_process.communicate()
-            self._denoiser_process = None
+        if self._denoiser_job_id is not None:
+            self._denoiser_worker.cancel()
+            self._denoiser_job_id = None
 
     def update(self, luxcore_session, scene):
         luxcore_session.GetFilm().GetOutputFloat(self._output_type, self.buffer)
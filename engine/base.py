@@ -43,6 +43,10 @@ class LuxCoreRenderEngine(bpy.types.RenderEngine):
     def __init__(self):
         self.session = None
         self.starting_session = False
+        # Animation render with persistent data: {view_layer_name: PersistentExport}
+        self.persistent_exports = {}
+        # Viewport denoiser, shared by all framebuffers of the session
+        self.denoiser_worker = None
         self.DENOISED_OUTPUT_NAME = "DENOISED"
         self.reset()
 
@@ -55,6 +59,8 @@ class LuxCoreRenderEngine(bpy.types.RenderEngine):
 
     def __del__(self):
         # Note: this method is also called when unregister() is called (for some reason I don't understand)
+        if getattr(self, "denoiser_worker", None):
+            self.denoiser_worker.shutdown()
         if getattr(self, "session", None):
             if not self.is_preview:
                 print("[Engine] del: stopping session")
@@ -97,6 +103,7 @@ class LuxCoreRenderEngine(bpy.types.RenderEngine):
             # Clean up
             del self.session
             self.session = None
+            self.persistent_exports.clear()
         finally:
             utils_view_layer.State.reset()
             LuxCoreRenderEngine.final_running = False
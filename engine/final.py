@@ -49,23 +49,64 @@ def render(engine, depsgraph):
         _render_layer(engine, depsgraph, statistics, layer)
 
         if engine.test_break():
-            # Blender skips the rest of the render layers anyway
+            # Blender skips the rest of the render layers and frames anyway
+            engine.persistent_exports.clear()
+            engine.exporter = None
             return
 
         print('[Engine/Final] Finished rendering layer "%s"' % layer.name)
+
+    # Exporters needed for the next frame are kept in engine.persistent_exports
+    engine.exporter = None
     
 
+class PersistentExport:
+    """
+    Keeps the exporter and the LuxCore scene of one view layer alive between animation frames.
+    """
+    def __init__(self, exporter, renderconfig, frame):
+        self.exporter = exporter
+        self.renderconfig = renderconfig
+        self.frame = frame
+
+
+def _use_persistent_data(engine, scene):
+    if not (engine.is_animation and scene.render.use_persistent_data):
+        return False
+
+    # Motion blur properties are tied to the object definitions, they are always exported from scratch
+    if utils.is_valid_camera(scene.camera) and scene.camera.data.luxcore.motion_blur.enable:
+        return False
+    return True
+
+
 def _render_layer(engine, depsgraph, statistics, view_layer):
     engine.reset()
-    engine.exporter = export.Exporter(statistics)
-    engine.session = engine.exporter.create_session(depsgraph, engine=engine, view_layer=view_layer)
     scene = depsgraph.scene_eval
+    use_persistent_data = _use_persistent_data(engine, scene)
+    persistent_export = engine.persistent_exports.pop(view_layer.name, None)
+
+    if (use_persistent_data and persistent_export
+            and persistent_export.frame + scene.frame_step == scene.frame_current):
+        # Next frame of the animation: only export what changed since the previous frame
+        engine.exporter = persistent_export.exporter
+        engine.session = engine.exporter.update_animation_frame(depsgraph, persistent_export.renderconfig,
+                                                                engine, view_layer)
+    else:
+        engine.exporter = export.Exporter(statistics, persistent_data=use_persistent_data)
+        engine.session = engine.exporter.create_session(depsgraph, engine=engine, view_layer=view_layer)
 
     if engine.session is None:
         # session is None, but no error was thrown
         print("[Engine/Final] Export cancelled by user.")
         return
 
+    if use_persistent_data and scene.frame_current + scene.frame_step <= scene.frame_end:
+        # Keep the scene for the next frame. After the last frame, it is freed with the exporter.
+        engine.persistent_exports[view_layer.name] = PersistentExport(engine.exporter,
+                                                                      engine.session.GetRenderConfig(),
+                                                                      scene.frame_current)
+
     engine.framebuffer = FrameBufferFinal(scene)
 
     # Create session (in case of OpenCL engines, render kernels are compiled here)
@@ -144,5 +144,6 @@ def view_draw(engine, context, depsgraph):
     # Show formatted statistics in Blender UI
     config = engine.session.GetRenderConfig()
     stats = engine.session.GetStats()
-    pretty_stats = utils_render.get_pretty_stats(config, stats, scene, context)
+    mesh_stats = engine.exporter.object_cache2.get_mesh_stats()
+    pretty_stats = utils_render.get_pretty_stats(config, stats, scene, context, mesh_stats)
     engine.update_stats(pretty_stats, status_message)
@@ -1,15 +1,18 @@
 import bpy
+import os
 from time import time
 from ..bin import pyluxcore
 from .. import utils
 from ..utils import render as utils_render
 from ..utils import compatibility as utils_compatibility
+from ..utils import node as utils_node
 from ..utils.errorlog import LuxCoreErrorLog
 from . import (
     blender_object, caches, camera, config, duplis,
     group_instance, imagepipeline, light, material,
-    motion_blur, hair, halt, world,
+    motion_blur, hair, halt, smoke, world,
 )
+from .profiler import ExportProfiler
 from .light import WORLD_BACKGROUND_LIGHT_NAME
 
 
@@ -43,19 +46,24 @@ class Change:
 
 
 class Exporter(object):
-    def __init__(self, stats=None):
+    def __init__(self, stats=None, persistent_data=False):
         self.scene = None  # TODO I would like to remove this, the evaluated scene is temporary
         self.stats = stats
+        # If True, the LuxCore scene is kept alive between animation frames and updated
+        # with update_animation_frame(). All meshes are exported as instances in this mode.
+        self.persistent_data = persistent_data
 
         self.config_cache = caches.StringCache()
         self.camera_cache = caches.CameraCache()
         # self.object_cache = caches.ObjectCache()
         self.object_cache2 = caches.ObjectCache2()
         self.material_cache = caches.MaterialCache()
-        self.visibility_cache = caches.VisibilityCache()
+        self.visibility_cache = caches.VisibilityCache(self.object_cache2.instance_keys)
         self.world_cache = caches.WorldCache()
         self.imagepipeline_cache = caches.StringCache()
         self.halt_cache = caches.StringCache()
+        # Grids of smoke domains, shared by all smoke textures
+        self.smoke_grid_cache = smoke.GridCache()
         self.motion_blur_enabled = False
         
         # A dictionary with the following mapping:
@@ -67,9 +75,18 @@ class Exporter(object):
         # to export, because we don't have one global properties object.
         self.node_cache = {}
 
+        # A dictionary with the following mapping:
+        # {(material_key, is_viewport_render): (luxcore_name, props)}
+        # Avoids converting the same material again for every object that uses it.
+        # Entries of materials changed during viewport render are replaced by the MaterialCache.
+        self.material_conversion_cache = {}
+
         # If a light/material uses a lightgroup, the id is stored here during export
         self.lightgroup_cache = set()
 
+        # Timings of the last export, see _write_profile_report()
+        self.profiler = ExportProfiler()
+
     def create_session(self, depsgraph, context=None, engine=None, view_layer=None):
         # Notes:
         # In final render, context is None
@@ -77,16 +94,16 @@ class Exporter(object):
         print("[Exporter] Creating session")
         start = time()
         # TODO 2.8 I'm not too happy about this, we shouldn't keep any reference to temporary data, even if only for a while
-        self.scene = depsgraph.scene_eval
-        scene = self.scene
-        stats = self.stats
-        if stats:
-            stats.reset()
+        scene = self._begin_export(depsgraph, is_viewport_render=context is not None)
+        profiler = self.profiler
 
         # We have to run the compatibility code before export because it could be that
         # the user has linked/appended assets with node trees from previous versions of
         # the addon since opening the .blend file.
-        utils_compatibility.run()
+        with profiler.stage("Compatibility"):
+            utils_compatibility.run()
+        # Node trees might have been changed by the compatibility code or since the last export
+        utils_node.tree_index.clear()
 
         # Scene
         luxcore_scene = pyluxcore.Scene()
@@ -97,8 +114,9 @@ class Exporter(object):
         scene_props.Set(pyluxcore.Property("scene.materials.__CLAY__.kd", [0.5] * 3))
 
         # Camera (needs to be parsed first because it is needed for hair tesselation)
-        self.camera_cache.diff(self, scene, depsgraph, context)  # Init camera cache
-        luxcore_scene.Parse(self.camera_cache.props)
+        with profiler.stage("Camera"):
+            self.camera_cache.diff(self, scene, depsgraph, context)  # Init camera cache
+            luxcore_scene.Parse(self.camera_cache.props)
 
         if utils.is_valid_camera(scene.camera):
             blur_settings = scene.camera.data.luxcore.motion_blur
@@ -109,8 +127,10 @@ class Exporter(object):
 
         # Objects and lights
         is_viewport_render = context is not None
-        if not self.object_cache2.first_run(self, depsgraph, view_layer, engine, luxcore_scene, scene_props, is_viewport_render):
-            return None
+        with profiler.stage("Objects"):
+            if not self.object_cache2.first_run(self, depsgraph, view_layer, engine, luxcore_scene,
+                                                scene_props, is_viewport_render):
+                return None
         if is_viewport_render:
             # Init
             self.visibility_cache.diff(depsgraph)
@@ -120,8 +140,9 @@ class Exporter(object):
         # Motion blur seems not to work in viewport render, i.e. matrix_world is the same on every frame
         if not context and utils.is_valid_camera(scene.camera):
             if self.motion_blur_enabled:
-                motion_blur_props, cam_moving = motion_blur.convert(context, engine, scene, depsgraph,
-                                                                    self.object_cache2)
+                with profiler.stage("Motion Blur"):
+                    motion_blur_props, cam_moving = motion_blur.convert(context, engine, scene, depsgraph,
+                                                                        self.object_cache2)
 
                 if cam_moving:
                     # Re-export the camera with motion blur enabled
@@ -132,46 +153,26 @@ class Exporter(object):
                 scene_props.Set(motion_blur_props)
 
         # World
-        world_props = world.convert(self, depsgraph, scene, is_viewport_render)
-        scene_props.Set(world_props)
+        with profiler.stage("World"):
+            world_props = world.convert(self, depsgraph, scene, is_viewport_render)
+            scene_props.Set(world_props)
 
         if scene.luxcore.debug.enabled and scene.luxcore.debug.print_properties:
             print("-" * 50)
             print("DEBUG: Scene Properties:\n")
             print(scene_props)
             print("-" * 50)
-        luxcore_scene.Parse(scene_props)
+        with profiler.stage("Scene Parse"):
+            luxcore_scene.Parse(scene_props)
+            self.object_cache2.export_instance_groups(luxcore_scene)
 
         # Regularly check if we should abort the export (important in heavy scenes)
         if engine and engine.test_break():
             return None
 
         # Convert config at last because all lightgroups and passes have to be already defined
-        config_props = config.convert(self, scene, context, engine)
-        if str(config_props) == "":
-            # Config props are empty: there was a critical error in config export, we can't render
-            raise Exception("Errors in config, check error log")
-
-        # Init config cache (convert to string here because config_props gets changed below)
-        self.config_cache.diff(str(config_props))
-
-        # Imagepipeline
-        imagepipeline_props = imagepipeline.convert(scene, context)
-        self.imagepipeline_cache.diff(imagepipeline_props)  # Init imagepipeline cache
-        # Add imagepipeline to config props
-        config_props.Set(imagepipeline_props)
-
-        # Halt conditions
-        halt_props = halt.convert(scene)
-        self.halt_cache.diff(halt_props)
-        config_props.Set(halt_props)
-
-        light_count = luxcore_scene.GetLightCount()
-        if light_count > 1000:
-            msg = "The scene contains a lot of light sources (%d), performance might suffer" % light_count
-            LuxCoreErrorLog.add_warning(msg)
-        if stats:
-            stats.light_count.value = light_count
+        config_props = self._convert_config(scene, context, engine)
+        self._check_light_count(luxcore_scene)
 
         # Create the renderconfig
         if scene.luxcore.debug.enabled and scene.luxcore.debug.print_properties:
@@ -179,17 +180,14 @@ class Exporter(object):
             print("DEBUG: Config Properties:\n")
             print(config_props)
             print("-" * 50)
-        renderconfig = pyluxcore.RenderConfig(config_props, luxcore_scene)
+        with profiler.stage("RenderConfig"):
+            renderconfig = pyluxcore.RenderConfig(config_props, luxcore_scene)
 
         # Regularly check if we should abort the export (important in heavy scenes)
         if engine and engine.test_break():
             return None
 
-        export_time = time() - start
-        print("Export took %.1f s" % export_time)
-        if stats:
-            stats.export_time.value = export_time
-            self._init_stats(stats, config_props, scene)
+        export_time = self._finish_export(start, config_props, scene, is_viewport_render)
 
         if engine:
             message = "Creating RenderSession"
@@ -215,24 +213,145 @@ class Exporter(object):
         self.scene = None
         return pyluxcore.RenderSession(renderconfig)
 
+    def update_animation_frame(self, depsgraph, renderconfig, engine, view_layer):
+        """
+        Create a session for the next frame of an animation, re-using the LuxCore scene of the
+        previous frame (kept in renderconfig). Only changed transformations, deformed meshes,
+        animated materials, the world and the config are exported again.
+        No session is running between frames, so the scene is edited directly.
+        """
+        assert self.persistent_data
+        print("[Exporter] Updating persistent scene")
+        start = time()
+        scene = self._begin_export(depsgraph, is_viewport_render=False)
+        profiler = self.profiler
+        self.node_cache.clear()
+
+        luxcore_scene = renderconfig.GetScene()
+        scene_props = pyluxcore.Properties()
+
+        if self.camera_cache.diff(self, scene, depsgraph, None):
+            scene_props.Set(self.camera_cache.props)
+
+        with profiler.stage("Objects"):
+            if not self.object_cache2.update_animation_frame(self, depsgraph, view_layer, engine,
+                                                             luxcore_scene, scene_props):
+                return None
+
+        self.material_cache.update_animated(self, depsgraph, False, scene_props)
+
+        if not scene.world or scene.world.luxcore.light == "none":
+            luxcore_scene.DeleteLight(WORLD_BACKGROUND_LIGHT_NAME)
+        scene_props.Set(world.convert(self, depsgraph, scene, is_viewport_render=False))
+
+        with profiler.stage("Scene Parse"):
+            luxcore_scene.Parse(scene_props)
+            # Meshes of the previous frame that were not defined again
+            self.object_cache2.remove_unused_meshes(luxcore_scene)
+
+        if engine and engine.test_break():
+            return None
+
+        # The config can change between frames, e.g. because of the animated seed
+        config_props = self._convert_config(scene, None, engine)
+        self._check_light_count(luxcore_scene)
+        renderconfig.Parse(config_props)
+
+        export_time = self._finish_export(start, config_props, scene, is_viewport_render=False)
+
+        if engine:
+            engine.update_stats("Export Finished (%.1f s)" % export_time, "Creating RenderSession ...")
+
+        # Do not hold reference to temporary data
+        self.scene = None
+        return pyluxcore.RenderSession(renderconfig)
+
+    def _begin_export(self, depsgraph, is_viewport_render):
+        """ Reset the statistics and the profiler, shared by create_session() and update_animation_frame() """
+        self.scene = depsgraph.scene_eval
+        if self.stats:
+            self.stats.reset()
+        self.profiler.reset()
+        # Timing every object and material is only worth it if the report is written
+        debug = self.scene.luxcore.debug
+        self.profiler.enabled = not is_viewport_render and debug.enabled and debug.write_export_profile
+        # Viewport sessions would keep the extracted grids next to LuxCore's copy
+        self.smoke_grid_cache.keep_grids = not is_viewport_render
+        return self.scene
+
+    def _convert_config(self, scene, context, engine):
+        """ Convert config, imagepipeline and halt conditions and initialize their caches """
+        with self.profiler.stage("Config"):
+            config_props = config.convert(self, scene, context, engine)
+        if str(config_props) == "":
+            # Config props are empty: there was a critical error in config export, we can't render
+            raise Exception("Errors in config, check error log")
+
+        # Init config cache (convert to string here because config_props gets changed below)
+        self.config_cache.diff(str(config_props))
+
+        # Imagepipeline
+        imagepipeline_props = imagepipeline.convert(scene, context)
+        self.imagepipeline_cache.diff(imagepipeline_props)  # Init imagepipeline cache
+        # Add imagepipeline to config props
+        config_props.Set(imagepipeline_props)
+
+        # Halt conditions
+        halt_props = halt.convert(scene)
+        self.halt_cache.diff(halt_props)
+        config_props.Set(halt_props)
+        return config_props
+
+    def _check_light_count(self, luxcore_scene):
+        light_count = luxcore_scene.GetLightCount()
+        if light_count > 1000:
+            msg = "The scene contains a lot of light sources (%d), performance might suffer" % light_count
+            LuxCoreErrorLog.add_warning(msg)
+        if self.stats:
+            self.stats.light_count.value = light_count
+
+    def _finish_export(self, start, config_props, scene, is_viewport_render):
+        """ Update the statistics and the profile report, returns the export time """
+        export_time = time() - start
+        print("Export took %.1f s" % export_time)
+        stats = self.stats
+        if stats:
+            stats.export_time.value = export_time
+            stats.smoke_grids_reused.value = self.smoke_grid_cache.hits
+            self._init_stats(stats, config_props, scene)
+        if not is_viewport_render:
+            self._write_profile_report(scene)
+            # LuxCore has its own copy of the grids now, only viewport renders re-use them for updates
+            self.smoke_grid_cache.clear()
+        return export_time
+
     def get_changes(self, depsgraph, context=None):
         self.scene = depsgraph.scene_eval
         scene = self.scene
         changes = Change.NONE
         final = context is None
 
+        # If the fingerprint did not change since the last call, nothing that could affect
+        # the config, camera, imagepipeline or halt conditions was changed, so their conversion is skipped
+        if final:
+            fingerprint = utils.get_scene_fingerprint(depsgraph.scene)
+        else:
+            fingerprint = utils.get_view_fingerprint(scene, context)
+
         if not final:
             # Changes that only need to be checked in viewport render, not in final render
-            config_props = config.convert(self, scene, context)
-            if self.config_cache.diff(config_props):
-                changes |= Change.CONFIG
+            if not self.config_cache.is_unchanged(fingerprint):
+                config_props = config.convert(self, scene, context)
+                if self.config_cache.diff(config_props, fingerprint):
+                    changes |= Change.CONFIG
 
-            if self.camera_cache.diff(self, scene, depsgraph, context):
+            if self.camera_cache.diff(self, scene, depsgraph, context, fingerprint):
                 changes |= Change.CAMERA
 
             if self.object_cache2.diff(depsgraph):
                 changes |= Change.OBJECT
 
+            utils_node.tree_index.update(depsgraph)
             if self.material_cache.diff(depsgraph):
                 changes |= Change.MATERIAL
 
@@ -243,14 +362,15 @@ class Exporter(object):
                 changes |= Change.WORLD
 
         # Relevant during final render
-        imagepipeline_props = imagepipeline.convert(depsgraph.scene, context)
-        if self.imagepipeline_cache.diff(imagepipeline_props):
-            changes |= Change.IMAGEPIPELINE
+        if not self.imagepipeline_cache.is_unchanged(fingerprint):
+            imagepipeline_props = imagepipeline.convert(depsgraph.scene, context)
+            if self.imagepipeline_cache.diff(imagepipeline_props, fingerprint):
+                changes |= Change.IMAGEPIPELINE
 
-        if final:
+        if final and not self.halt_cache.is_unchanged(fingerprint):
             # Halt conditions are only used during final render
             halt_props = halt.convert(depsgraph.scene)
-            if self.halt_cache.diff(halt_props):
+            if self.halt_cache.diff(halt_props, fingerprint):
                 changes |= Change.HALT
 
         # Do not hold reference to temporary data
@@ -274,6 +394,8 @@ class Exporter(object):
             try:
                 props = self._update_scene(depsgraph, context, changes, luxcore_scene)
                 luxcore_scene.Parse(props)
+                # Only possible after parsing, the new objects have to reference their meshes first
+                self.object_cache2.remove_unused_meshes(luxcore_scene)
             except Exception as error:
                 LuxCoreErrorLog.add_error(error)
                 import traceback
@@ -378,28 +500,30 @@ class Exporter(object):
             props.Set(self.camera_cache.props)
 
         if changes & Change.OBJECT:
+            self.smoke_grid_cache.update(depsgraph)
             self.object_cache2.update(self, depsgraph, luxcore_scene, props)
 
         if changes & Change.MATERIAL:
             # for mat in self.material_cache.changed_materials:
             #     luxcore_name, mat_props = material.convert(self, mat, context.scene, context)
             #     props.Set(mat_props)
-            self.material_cache.update(self, depsgraph, context, props)
+            self.material_cache.update(self, depsgraph, True, props)
 
         if changes & Change.VISIBILITY:
             for key in self.visibility_cache.objects_to_remove:
                 print("Removing object with key", key)
 
                 try:
-                    self.object_cache2.exported_objects[key].delete(luxcore_scene)
-                    del self.object_cache2.exported_objects[key]
+                    self.object_cache2.delete_object(key, luxcore_scene)
                 except KeyError:
                     # This should be ok, not every exportable object is added to exported_objects
                     print("Could not find object to remove for key", key)
 
             if self.visibility_cache.objects_to_remove:
-                # luxcore_scene.RemoveUnusedMeshes()  # TODO for some reason this deletes even some meshes that are still in use
+                # Meshes are removed in update() after the new object definitions were parsed
                 luxcore_scene.RemoveUnusedMaterials()
+                # Materials might have been deleted, they have to be emitted again when used
+                self.material_conversion_cache.clear()
                 luxcore_scene.RemoveUnusedTextures()
                 luxcore_scene.RemoveUnusedImageMaps()
 
@@ -412,7 +536,30 @@ class Exporter(object):
 
         return props
 
+    def _write_profile_report(self, scene):
+        """ Write the export timings as JSON file next to the rendered image (if enabled in debug settings) """
+        if not self.profiler.enabled:
+            return
+
+        frame_path = scene.render.frame_path(frame=scene.frame_current)
+        filepath = os.path.splitext(frame_path)[0] + "_export_profile.json"
+        try:
+            self.profiler.write_report(filepath)
+        except OSError as error:
+            LuxCoreErrorLog.add_warning("Could not write export profile: %s" % error)
+
     def _init_stats(self, stats, config_props, scene):
+        profiler = self.profiler
+        stats.objects_export_time.value = profiler.get_stage_time("Objects")
+        if profiler.enabled:
+            # Only measured if the export profile is written
+            stats.materials_export_time.value = profiler.get_category_time("MATERIAL")
+            stats.hair_export_time.value = profiler.get_category_time("HAIR")
+        stats.config_export_time.value = (profiler.get_stage_time("Config")
+                                          + profiler.get_stage_time("RenderConfig"))
+        mesh_count, _, mesh_memory = self.object_cache2.get_mesh_stats()
+        stats.mesh_count.value = mesh_count
+        stats.mesh_memory.value = mesh_memory
         render_engine = config_props.Get("renderengine.type").GetString()
         stats.render_engine.value = utils_render.engine_to_str(render_engine)
         sampler = config_props.Get("sampler.type").GetString()
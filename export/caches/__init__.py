@@ -7,20 +7,33 @@ from .object_cache import ObjectCache2
 
 
 class StringCache:
+    """
+    Detects changes by comparing the string representation of properties.
+    Callers can pass a fingerprint of the inputs of the conversion (see utils.get_scene_fingerprint),
+    then is_unchanged() tells them if they can skip the conversion and the comparison.
+    """
     def __init__(self):
         self.props = None
+        # String representation of self.props, so it is only created once
+        self.props_str = None
+        self.fingerprint = None
 
-    def diff(self, new_props):
-        props_str = str(self.props)
+    def is_unchanged(self, fingerprint):
+        return self.props is not None and fingerprint is not None and fingerprint == self.fingerprint
+
+    def diff(self, new_props, fingerprint=None):
         new_props_str = str(new_props)
+        self.fingerprint = fingerprint
 
         if self.props is None:
             # Not initialized yet
             self.props = new_props
+            self.props_str = new_props_str
             return True
 
-        has_changes = props_str != new_props_str
+        has_changes = self.props_str != new_props_str
         self.props = new_props
+        self.props_str = new_props_str
         return has_changes
 
 
@@ -32,10 +45,13 @@ class CameraCache:
     def props(self):
         return self.string_cache.props
 
-    def diff(self, exporter, scene, depsgraph, context):
+    def diff(self, exporter, scene, depsgraph, context, fingerprint=None):
+        if self.string_cache.is_unchanged(fingerprint):
+            return False
+
         # String cache
         camera_props = camera.convert(exporter, scene, depsgraph, context)
-        has_changes = self.string_cache.diff(camera_props)
+        has_changes = self.string_cache.diff(camera_props, fingerprint)
 
         # Check camera object and data for changes
         # Needed in case the volume node tree was relinked/unlinked
@@ -60,10 +76,28 @@ class MaterialCache:
 
     def update(self, exporter, depsgraph, is_viewport_render, props):
         for mat in self.changed_materials:
-            lux_mat_name, mat_props = material.convert(exporter, depsgraph, mat, is_viewport_render)
+            # Replace the outdated entry in the conversion cache
+            exporter.material_conversion_cache.pop((utils.make_key(mat), is_viewport_render), None)
+            lux_mat_name, mat_props = material.convert_cached(exporter, depsgraph, mat, is_viewport_render)
             props.Set(mat_props)
         self.changed_materials.clear()
 
+    def update_animated(self, exporter, depsgraph, is_viewport_render, props):
+        """
+        Re-convert all already exported materials that are animated.
+        Used between the frames of an animation render with persistent data,
+        where the depsgraph does not tell us which materials were changed.
+        """
+        for datablock in depsgraph.ids:
+            if not isinstance(datablock, bpy.types.Material):
+                continue
+
+            key = (utils.make_key(datablock), is_viewport_render)
+            if key in exporter.material_conversion_cache and _is_material_animated(datablock.original):
+                del exporter.material_conversion_cache[key]
+                lux_mat_name, mat_props = material.convert_cached(exporter, depsgraph, datablock, is_viewport_render)
+                props.Set(mat_props)
+
 # def diff(self, ignored_mats=None):
     #     self._reset()
     #
@@ -94,32 +128,167 @@ class MaterialCache:
     #     return self.changed_materials
 
 
+def _is_material_animated(mat):
+    """ Check for keyframes and drivers on the material and all node trees it uses """
+    if _has_animation(mat):
+        return True
+
+    visited = set()
+    if mat.luxcore.use_cycles_nodes and mat.node_tree:
+        return _is_node_tree_animated(mat.node_tree, visited)
+    node_tree = mat.luxcore.node_tree
+    return bool(node_tree and _is_node_tree_animated(node_tree, visited))
+
+
+def _is_node_tree_animated(node_tree, visited):
+    pointer = node_tree.as_pointer()
+    if pointer in visited:
+        return False
+    visited.add(pointer)
+
+    if _has_animation(node_tree):
+        return True
+
+    # Pointer nodes (LuxCore node trees) and group nodes (Cycles node trees) reference other node trees
+    for node in node_tree.nodes:
+        sub_tree = getattr(node, "node_tree", None)
+        if sub_tree and _is_node_tree_animated(sub_tree, visited):
+            return True
+    return False
+
+
+def _has_animation(datablock):
+    anim = datablock.animation_data
+    return bool(anim and (anim.action or anim.drivers or anim.nla_tracks))
+
+
 class VisibilityCache:
-    def __init__(self):
+    """
+    Keeps track of the keys of all visible objects and instances. Walking over all
+    object instances is slow with particle systems, so the set is updated incrementally
+    from the depsgraph updates where possible. Only changes that can affect instances
+    (collection changes, changes of instancers or instanced objects) and view layer
+    switches need a walk over all instances.
+    """
+    def __init__(self, instance_keys):
+        # utils.InstanceKeyCache, shared with the ObjectCache2
+        self.instance_keys = instance_keys
         # sets containing keys
         self.last_visible_objects = None
         self.objects_to_remove = None
+        # (scene pointer, view layer name) of the last diff
+        self.view_layer_id = None
+        # Pointers of the visible objects in the view layer (not including instances)
+        self.visible_bases = set()
+        # Pointers of instancers and instanced objects, changes to them require a full walk
+        self.instancers = set()
+        self.instanced_objects = set()
 
     def diff(self, depsgraph):
-        visible_objs = self._get_visible_objects(depsgraph)
+        view_layer = depsgraph.view_layer
+        view_layer_id = (depsgraph.scene.as_pointer(), view_layer.name)
+
         if self.last_visible_objects is None:
             # Not initialized yet
-            self.last_visible_objects = visible_objs
+            self.view_layer_id = view_layer_id
+            self.last_visible_objects = self._get_visible_objects(depsgraph)
+            self.visible_bases = set(self._get_visible_bases(view_layer))
             return False
 
+        if view_layer_id != self.view_layer_id:
+            self.view_layer_id = view_layer_id
+            visible_objs = self._get_visible_objects(depsgraph)
+            self.visible_bases = set(self._get_visible_bases(view_layer))
+        else:
+            visible_objs = self._update_visible_objects(depsgraph, view_layer)
+
         self.objects_to_remove = self.last_visible_objects - visible_objs
         self.last_visible_objects = visible_objs
         return self.objects_to_remove
 
+    def _update_visible_objects(self, depsgraph, view_layer):
+        # {pointer: object or None if the object was deleted}
+        changed_objects = {}
+        view_layer_changed = False
+
+        for dg_update in depsgraph.updates:
+            datablock = dg_update.id
+            if isinstance(datablock, bpy.types.Object):
+                if dg_update.is_updated_transform and not dg_update.is_updated_geometry:
+                    # Moving objects does not change the visibility
+                    continue
+                obj = datablock.original
+                changed_objects[obj.as_pointer()] = obj
+            elif isinstance(datablock, bpy.types.Collection):
+                # Objects might have been linked or unlinked, which can also affect instances
+                return self._get_visible_objects(depsgraph)
+            elif isinstance(datablock, bpy.types.Scene):
+                # Hide flags in the view layer, added or deleted objects
+                view_layer_changed = True
+
+        if view_layer_changed:
+            visible_bases = self._get_visible_bases(view_layer)
+            for pointer in visible_bases.keys() ^ self.visible_bases:
+                # Objects that were hidden or deleted are not in visible_bases anymore
+                changed_objects.setdefault(pointer, visible_bases.get(pointer))
+            self.visible_bases = set(visible_bases)
+
+        for pointer, obj in changed_objects.items():
+            if (pointer in self.instancers or pointer in self.instanced_objects
+                    or (obj and _is_instancer(obj))):
+                # The instances can't be updated without looking at all of them
+                return self._get_visible_objects(depsgraph)
+
+        visible_objs = set(self.last_visible_objects)
+        for pointer, obj in changed_objects.items():
+            # Same as utils.make_key(), the key of objects that are not instanced is their pointer
+            key = str(pointer)
+            # Instancers were handled above, for all other objects show_self is always True
+            if obj and _is_object_visible(obj, view_layer):
+                visible_objs.add(key)
+            else:
+                visible_objs.discard(key)
+        return visible_objs
+
     def _get_visible_objects(self, depsgraph):
         keys = set()
+        self.instancers.clear()
+        self.instanced_objects.clear()
+        view_layer = depsgraph.view_layer
+
         for dg_obj_instance in depsgraph.object_instances:
-            if dg_obj_instance.show_self:
-                obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
-                if obj.type in EXPORTABLE_OBJECTS:
-                    keys.add(utils.make_key_from_instance(dg_obj_instance))
+            if dg_obj_instance.is_instance:
+                self.instancers.add(dg_obj_instance.parent.original.as_pointer())
+                self.instanced_objects.add(dg_obj_instance.instance_object.original.as_pointer())
+
+            if not dg_obj_instance.show_self:
+                continue
+
+            if dg_obj_instance.is_instance:
+                # Instances are not part of the view layer, they are visible if their instancer is
+                visible = dg_obj_instance.instance_object.type in EXPORTABLE_OBJECTS
+            else:
+                # Same check as in the incremental update, so both always agree
+                visible = _is_object_visible(dg_obj_instance.object.original, view_layer)
+
+            if visible:
+                keys.add(self.instance_keys.get_key(dg_obj_instance))
         return keys
 
+    @staticmethod
+    def _get_visible_bases(view_layer):
+        """ Returns {pointer: object} of all visible objects in the view layer """
+        return {obj.as_pointer(): obj for obj in view_layer.objects if obj.visible_get(view_layer=view_layer)}
+
+
+def _is_object_visible(obj, view_layer):
+    """ Visibility of an object that is not an instance, used by all code paths of the VisibilityCache """
+    return obj.type in EXPORTABLE_OBJECTS and obj.visible_get(view_layer=view_layer)
+
+
+def _is_instancer(obj):
+    return obj.instance_type != "NONE" or bool(obj.particle_systems)
+
 
 class WorldCache:
     def __init__(self):
@@ -10,6 +10,18 @@ class ExportedPart:
 class ExportedMesh:
     def __init__(self, mesh_definitions):
         self.mesh_definitions = mesh_definitions
+        # Estimated size of the shapes in LuxCore, set by mesh_converter
+        self.triangle_count = 0
+        self.memory = 0
+        # Names of the pointiness shapes that were already defined from the shapes of this mesh
+        self.pointiness_shapes = set()
+        # False if LuxCore deleted some of the shapes (e.g. the sources of pointiness shapes)
+        # while the mesh is still in use. New users have to convert the mesh again.
+        self.is_complete = True
+
+    @property
+    def shape_names(self):
+        return [shape_name for shape_name, mat_index in self.mesh_definitions]
 
 
 class ExportedData:
@@ -19,12 +31,15 @@ class ExportedData:
 
 class ExportedObject(ExportedData):
     # TODO id, camera visibility etc.
-    def __init__(self, lux_name_base, mesh_definitions, mat_names, transform, visible_to_camera, obj_id=-1):
+    def __init__(self, lux_name_base, mesh_definitions, mat_names, transform, visible_to_camera, obj_id=-1,
+                 mesh_key=None):
         self.lux_name_base = lux_name_base
         self.transform = transform
         self.parts = []
         self.visible_to_camera = visible_to_camera
         self.obj_id = obj_id
+        # Key of the mesh in ObjectCache2.exported_meshes, used for reference counting
+        self.mesh_key = mesh_key
 
         for (shape_name, mat_index), mat_name in zip(mesh_definitions, mat_names):
             obj_name = lux_name_base + str(mat_index)
@@ -32,20 +47,24 @@ class ExportedObject(ExportedData):
             self.parts.append(ExportedPart(obj_name, shape_name, mat_name))
 
     def get_props(self):
-        prefix = "scene.objects."
-        definitions = {}
+        builder = utils.PropertyBuilder()
+        self.add_props(builder)
+        return builder.get_props()
+
+    def add_props(self, builder):
+        """ Add the definitions of all parts to a utils.PropertyBuilder """
+        transformation = utils.matrix_to_list(self.transform) if self.transform else None
 
         for part in self.parts:
-            definitions[part.lux_obj + ".shape"] = part.lux_shape
-            definitions[part.lux_obj + ".material"] = part.lux_mat
-            definitions[part.lux_obj + ".camerainvisible"] = not self.visible_to_camera
+            prefix = "scene.objects." + part.lux_obj
+            builder.add(prefix + ".shape", part.lux_shape)
+            builder.add(prefix + ".material", part.lux_mat)
+            builder.add(prefix + ".camerainvisible", not self.visible_to_camera)
             if self.obj_id != -1:
-                definitions[part.lux_obj + ".id"] = self.obj_id
-
-            if self.transform:
-                definitions[part.lux_obj + ".transformation"] = utils.matrix_to_list(self.transform)
+                builder.add(prefix + ".id", self.obj_id)
 
-        return utils.create_props(prefix, definitions)
+            if transformation:
+                builder.add(prefix + ".transformation", transformation)
 
     def delete(self, luxcore_scene):
         for part in self.parts:
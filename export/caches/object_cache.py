@@ -1,10 +1,14 @@
 import bpy
+import numpy as np
+from array import array
+from itertools import chain
 from ... import utils
 from ...bin import pyluxcore
-from .. import mesh_converter
+from .. import mesh_converter, mesh_cache
 from ..hair import convert_hair
 from .exported_data import ExportedObject
 from .. import light
+from ...utils.errorlog import LuxCoreErrorLog
 
 MESH_OBJECTS = {"MESH", "CURVE", "SURFACE", "META", "FONT"}
 EXPORTABLE_OBJECTS = MESH_OBJECTS | {"LIGHT"}
@@ -30,43 +34,174 @@ def get_material(obj, material_index, exporter, depsgraph, is_viewport_render):
     if mat:
         use_pointiness = False
         if mat.luxcore.node_tree:
-            # Check if a pointiness node exists, better check would be if the node is linked
-            use_pointiness = len(utils_node.find_nodes(mat.luxcore.node_tree, "LuxCoreNodeTexPointiness")) > 0
-            imagemaps = utils_node.find_nodes(mat.luxcore.node_tree, "LuxCoreNodeTexImagemap")
-            if imagemaps and not utils_node.has_valid_uv_map(obj):
-                msg = (utils.pluralize("%d image texture", len(imagemaps)) + " used, but no UVs defined. "
+            tree_info = utils_node.tree_index.get(mat.luxcore.node_tree)
+            use_pointiness = tree_info.uses_pointiness
+            if tree_info.needs_uv_map and not utils_node.has_valid_uv_map(obj):
+                msg = (utils.pluralize("%d image texture", tree_info.imagemap_count) + " used, but no UVs defined. "
                        "In case of bumpmaps this can lead to artifacts")
                 LuxCoreErrorLog.add_warning(msg, obj_name=obj.name)
 
-        lux_mat_name, mat_props = material.convert(exporter, depsgraph, mat, is_viewport_render, obj.name)
+        lux_mat_name, mat_props = material.convert_cached(exporter, depsgraph, mat, is_viewport_render, obj.name)
         return lux_mat_name, mat_props, use_pointiness
     else:
         lux_mat_name, mat_props = material.fallback()
         return lux_mat_name, mat_props, False
 
+
+class InstanceGroup:
+    """
+    Collects the transformations and object IDs of all instances of one mesh,
+    so they can be passed to LuxCore with a single DuplicateObject call.
+    """
+    def __init__(self, template_key):
+        # Key of the template object in exported_objects, it is deleted after duplication
+        self.template_key = template_key
+        self.matrices = array("f")
+        self.object_ids = array("I")
+        self.count = 0
+
+    def add(self, matrix, object_id):
+        # Rows first, all matrices are converted in one batch by utils.matrices_to_array()
+        self.matrices.extend(chain.from_iterable(matrix))
+        self.object_ids.append(object_id)
+        self.count += 1
+
+
 class ObjectCache2:
     def __init__(self):
         self.exported_objects = {}
         self.exported_meshes = {}
+        # Reference counting of meshes: {mesh_key: {obj_key, ...}}, the exported objects using each mesh
+        self.mesh_users = {}
+        # Shapes that might not be used by any object anymore, deleted by remove_unused_meshes()
+        self.outdated_shapes = set()
+        # Final render only: {group_key: InstanceGroup}, exported by export_instance_groups()
+        self.instance_groups = {}
+        # Reverse index for updates: {blender_obj_key: {obj_key, ...}}
+        # Contains the keys of all exported instances of an object, and the
+        # keys of all instances generated by an object (e.g. particles).
+        self.obj_keys_by_blender_obj = {}
+        # Shared with the VisibilityCache and motion blur export
+        self.instance_keys = utils.InstanceKeyCache()
+        # Absolute path of the on-disk mesh cache, or None if it is not used
+        self.mesh_cache_dir = None
+        # mesh_converter.ConversionPipeline, only used during first_run() of final renders
+        self.conversion_pipeline = None
+        # utils.PropertyBuilder that collects the object definitions during first_run()
+        self.props_builder = None
 
     def first_run(self, exporter, depsgraph, view_layer, engine, luxcore_scene, scene_props, is_viewport_render):
-        # TODO use luxcore_scene.DuplicateObjects for instances
-        for index, dg_obj_instance in enumerate(depsgraph.object_instances, start=1):
-            obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
-            if not (self._is_visible(dg_obj_instance, obj) or obj.visible_get(view_layer=view_layer)):
-                continue
-
-            self._convert_obj(exporter, dg_obj_instance, obj, depsgraph,
-                              luxcore_scene, scene_props, is_viewport_render)
-            if engine:
-                # Objects are the most expensive to export, so they dictate the progress
-                # engine.update_progress(index / obj_amount)
-                if engine.test_break():
-                    return False
+        # Also used by the VisibilityCache, which is initialized after this
+        self.instance_keys.clear()
+        try:
+            self.mesh_cache_dir = mesh_cache.get_cache_dir(depsgraph.scene_eval, is_viewport_render)
+        except OSError as error:
+            LuxCoreErrorLog.add_warning("Mesh cache disabled: %s" % error)
+            self.mesh_cache_dir = None
+
+        if not is_viewport_render and not self.mesh_cache_dir:
+            self.conversion_pipeline = mesh_converter.ConversionPipeline(luxcore_scene)
+        self.props_builder = utils.PropertyBuilder()
+
+        try:
+            for index, dg_obj_instance in enumerate(depsgraph.object_instances, start=1):
+                obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
+                if not (self._is_visible(dg_obj_instance, obj) or obj.visible_get(view_layer=view_layer)):
+                    continue
+
+                with exporter.profiler.measure("OBJECT", obj.name):
+                    if self._use_instance_group(exporter, dg_obj_instance, obj, is_viewport_render):
+                        self._add_to_instance_group(exporter, dg_obj_instance, obj, depsgraph,
+                                                    luxcore_scene, scene_props)
+                    else:
+                        self._convert_obj(exporter, dg_obj_instance, obj, depsgraph,
+                                          luxcore_scene, scene_props, is_viewport_render)
+                if engine:
+                    # Objects are the most expensive to export, so they dictate the progress
+                    # engine.update_progress(index / obj_amount)
+                    if engine.test_break():
+                        return False
+
+            if self.conversion_pipeline:
+                self.conversion_pipeline.finish()
+            scene_props.Set(self.props_builder.get_props())
+        finally:
+            if self.conversion_pipeline:
+                self.conversion_pipeline.abort()
+                self.conversion_pipeline = None
+            self.props_builder = None
 
         self._debug_info()
         return True
 
+    def _use_instance_group(self, exporter, dg_obj_instance, obj, is_viewport_render):
+        # In viewport render and with persistent data, every instance has to be a separate
+        # object so it can be updated. Objects with motion blur need per-object motion properties.
+        # Hair is exported per object and not duplicated with the template, so it would be lost.
+        return (not is_viewport_render
+                and not exporter.persistent_data
+                and dg_obj_instance.is_instance
+                and obj.type in MESH_OBJECTS
+                and obj.data is not None
+                and not (exporter.motion_blur_enabled and obj.luxcore.enable_motion_blur)
+                and not self._has_hair(obj))
+
+    def _add_to_instance_group(self, exporter, dg_obj_instance, obj, depsgraph, luxcore_scene, scene_props):
+        mesh_key = self._get_mesh_key(obj, use_instancing=True, is_viewport_render=False)
+        # Objects sharing a mesh can still differ in their object-linked materials and settings
+        group_key = mesh_key + "_" + utils.make_key(obj)
+
+        try:
+            group = self.instance_groups[group_key]
+        except KeyError:
+            # The first instance of the group is exported as template object
+            obj_key = self.instance_keys.get_key(dg_obj_instance)
+            self._convert_obj(exporter, dg_obj_instance, obj, depsgraph,
+                              luxcore_scene, scene_props, is_viewport_render=False)
+            group = InstanceGroup(obj_key)
+            self.instance_groups[group_key] = group
+
+        if obj.luxcore.id == -1:
+            obj_id = self.instance_keys.get_object_id(dg_obj_instance)
+        else:
+            obj_id = obj.luxcore.id
+
+        group.add(dg_obj_instance.matrix_world, obj_id)
+
+    def export_instance_groups(self, luxcore_scene):
+        """
+        Has to be called after the scene properties from first_run() were parsed,
+        because the template objects have to be defined before they can be duplicated.
+        """
+        for group in self.instance_groups.values():
+            # The template is deleted after duplication, so don't keep track of it
+            exported_obj = self.exported_objects.pop(group.template_key, None)
+            if exported_obj is None:
+                # The mesh could not be exported (e.g. no faces)
+                continue
+
+            transformations = utils.matrices_to_array(np.frombuffer(group.matrices, dtype=np.float32),
+                                                      dtype=np.float32)
+
+            # Objects might be split if they have multiple materials
+            for part in exported_obj.parts:
+                src_name = part.lux_obj
+                dst_name = src_name + "dupli"
+                luxcore_scene.DuplicateObject(src_name, dst_name, group.count, transformations, group.object_ids)
+                # Delete the template object, we don't want it to show up in the scene
+                luxcore_scene.DeleteObject(src_name)
+
+        self.instance_groups.clear()
+
+    def _has_hair(self, obj):
+        return any(psys.settings.type == "HAIR" and psys.settings.render_type == "PATH"
+                   for psys in obj.particle_systems)
+
+    def _drain_pipeline(self):
+        """ Has to be called before any LuxCore scene access that does not go through the conversion pipeline """
+        if self.conversion_pipeline:
+            self.conversion_pipeline.drain()
+
     def _debug_info(self):
         print("Objects in cache:", len(self.exported_objects))
         print("Meshes in cache:", len(self.exported_meshes))
@@ -97,13 +232,16 @@ class ObjectCache2:
         if obj.type == "EMPTY" or obj.data is None:
             return
 
-        obj_key = utils.make_key_from_instance(dg_obj_instance)
+        obj_key = self.instance_keys.get_key(dg_obj_instance)
+        self._add_to_reverse_index(dg_obj_instance, obj_key)
 
         if obj.type in MESH_OBJECTS:
             # assert obj_key not in self.exported_objects
             self._convert_mesh_obj(exporter, dg_obj_instance, obj, obj_key, depsgraph,
                                    luxcore_scene, scene_props, is_viewport_render)
         elif obj.type == "LIGHT":
+            # Area lights define their mesh directly in the LuxCore scene
+            self._drain_pipeline()
             props, exported_stuff = light.convert_light(exporter, obj, obj_key, depsgraph, luxcore_scene,
                                                         dg_obj_instance.matrix_world.copy(), is_viewport_render)
             if exported_stuff:
@@ -115,53 +253,178 @@ class ObjectCache2:
             settings = psys.settings
 
             if settings.type == "HAIR" and settings.render_type == "PATH":
-                convert_hair(exporter, obj, psys, depsgraph, luxcore_scene, is_viewport_render)
+                self._drain_pipeline()
+                with exporter.profiler.measure("HAIR", "%s: %s" % (obj.name, psys.name)):
+                    convert_hair(exporter, obj, psys, depsgraph, luxcore_scene, is_viewport_render)
 
     def _convert_mesh_obj(self, exporter, dg_obj_instance, obj, obj_key, depsgraph,
                           luxcore_scene, scene_props, is_viewport_render):
         transform = dg_obj_instance.matrix_world
 
-        use_instancing = is_viewport_render or dg_obj_instance.is_instance or utils.can_share_mesh(obj.original) \
+        use_instancing = is_viewport_render or exporter.persistent_data or dg_obj_instance.is_instance \
+                         or utils.can_share_mesh(obj.original) \
                          or (exporter.motion_blur_enabled and obj.luxcore.enable_motion_blur)
 
         mesh_key = self._get_mesh_key(obj, use_instancing, is_viewport_render)
         # print(obj.name, "mesh key:", mesh_key)
 
-        if use_instancing and mesh_key in self.exported_meshes:
+        # The instance is only valid during the depsgraph iteration, but the object
+        # might be defined later (when the mesh conversion pipeline is used)
+        obj_transform = transform.copy() if use_instancing else None
+        if obj.luxcore.id == -1:
+            obj_id = self.instance_keys.get_object_id(dg_obj_instance)
+        else:
+            obj_id = obj.luxcore.id
+
+        def define_obj(exported_mesh):
+            self._define_mesh_obj(exporter, obj, obj_key, mesh_key, exported_mesh, obj_transform, obj_id,
+                                  depsgraph, luxcore_scene, scene_props, is_viewport_render)
+
+        def on_mesh_converted(exported_mesh):
+            self._set_exported_mesh(mesh_key, exported_mesh)
+            define_obj(exported_mesh)
+
+        if use_instancing and self._is_mesh_reusable(mesh_key):
             # print("retrieving mesh from cache")
-            exported_mesh = self.exported_meshes[mesh_key]
+            define_obj(self.exported_meshes[mesh_key])
+        elif self.conversion_pipeline:
+            self.conversion_pipeline.submit(obj, mesh_key, depsgraph, is_viewport_render,
+                                            use_instancing, transform, on_mesh_converted)
         else:
             # print("fresh export")
             exported_mesh = mesh_converter.convert(obj, mesh_key, depsgraph, luxcore_scene,
-                                                   is_viewport_render, use_instancing, transform)
-            self.exported_meshes[mesh_key] = exported_mesh
+                                                   is_viewport_render, use_instancing, transform,
+                                                   self.mesh_cache_dir)
+            on_mesh_converted(exported_mesh)
+
+    def _define_mesh_obj(self, exporter, obj, obj_key, mesh_key, exported_mesh, obj_transform, obj_id,
+                         depsgraph, luxcore_scene, scene_props, is_viewport_render):
+        # Note: this is also a callback of the conversion pipeline, so the LuxCore scene may only be
+        # used when an old object is replaced, which never happens during first_run()
+        old_obj = self.exported_objects.get(obj_key)
+
+        if not exported_mesh:
+            if old_obj:
+                # The mesh has no faces anymore
+                self.delete_object(obj_key, luxcore_scene)
+            return
 
-        if exported_mesh:
-            mat_names = []
-            for idx, (shape_name, mat_index) in enumerate(exported_mesh.mesh_definitions):
-                lux_mat_name, mat_props, use_pointiness = get_material(obj, mat_index, exporter, depsgraph, is_viewport_render)
-                scene_props.Set(mat_props)
-                mat_names.append(lux_mat_name)
-
-                if use_pointiness:
-                    # Replace shape definition with pointiness shape
-                    pointiness_shape = shape_name + "_pointiness"
+        mesh_definitions = []
+        mat_names = []
+        for shape_name, mat_index in exported_mesh.mesh_definitions:
+            lux_mat_name, mat_props, use_pointiness = get_material(obj, mat_index, exporter, depsgraph, is_viewport_render)
+            scene_props.Set(mat_props)
+            mat_names.append(lux_mat_name)
+
+            if use_pointiness:
+                # Replace shape definition with pointiness shape
+                pointiness_shape = shape_name + "_pointiness"
+                if pointiness_shape not in exported_mesh.pointiness_shapes:
+                    # Only define it once, all users of the mesh can share it
                     prefix = "scene.shapes." + pointiness_shape + "."
                     scene_props.Set(pyluxcore.Property(prefix + "type", "pointiness"))
                     scene_props.Set(pyluxcore.Property(prefix + "source", shape_name))
-                    exported_mesh.mesh_definitions[idx] = [pointiness_shape, mat_index]
+                    exported_mesh.pointiness_shapes.add(pointiness_shape)
+                shape_name = pointiness_shape
+            mesh_definitions.append([shape_name, mat_index])
+
+        exported_obj = ExportedObject(obj_key, mesh_definitions, mat_names,
+                                      obj_transform, obj.luxcore.visible_to_camera, obj_id, mesh_key)
+        if self.props_builder is not None:
+            # All objects are defined with one SetFromString() call at the end of first_run()
+            exported_obj.add_props(self.props_builder)
+        else:
+            scene_props.Set(exported_obj.get_props())
 
-            obj_transform = transform.copy() if use_instancing else None
+        # Register the new user first, so a mesh is not released if it's still used by this object
+        self.mesh_users.setdefault(mesh_key, set()).add(obj_key)
 
-            if obj.luxcore.id == -1:
-                obj_id = utils.make_object_id(dg_obj_instance)
-            else:
-                obj_id = obj.luxcore.id
+        if isinstance(old_obj, ExportedObject):
+            # Parts of materials that were removed from the mesh
+            new_part_names = {part.lux_obj for part in exported_obj.parts}
+            for part in old_obj.parts:
+                if part.lux_obj not in new_part_names:
+                    luxcore_scene.DeleteObject(part.lux_obj)
+                    self.outdated_shapes.add(part.lux_shape)
+            if old_obj.mesh_key != mesh_key:
+                self._release_mesh(old_obj, obj_key)
 
-            exported_obj = ExportedObject(obj_key, exported_mesh.mesh_definitions, mat_names,
-                                          obj_transform, obj.luxcore.visible_to_camera, obj_id)
-            scene_props.Set(exported_obj.get_props())
-            self.exported_objects[obj_key] = exported_obj
+        self.exported_objects[obj_key] = exported_obj
+
+    def _is_mesh_reusable(self, mesh_key):
+        try:
+            exported_mesh = self.exported_meshes[mesh_key]
+        except KeyError:
+            return False
+        # None means the mesh has no faces
+        return exported_mesh is None or exported_mesh.is_complete
+
+    def _set_exported_mesh(self, mesh_key, exported_mesh):
+        """ Add a converted mesh to the cache, replacing an older version of the same mesh """
+        old_mesh = self.exported_meshes.get(mesh_key)
+        if old_mesh:
+            self.outdated_shapes.update(old_mesh.shape_names)
+            self.outdated_shapes.update(old_mesh.pointiness_shapes)
+        if exported_mesh:
+            # Shapes with the same name were replaced by LuxCore
+            self.outdated_shapes.difference_update(exported_mesh.shape_names)
+        self.exported_meshes[mesh_key] = exported_mesh
+
+    def _release_mesh(self, exported_obj, obj_key):
+        """ Remove an object from the users of its mesh """
+        mesh_key = getattr(exported_obj, "mesh_key", None)
+        users = self.mesh_users.get(mesh_key)
+        if users is None:
+            return
+
+        users.discard(obj_key)
+        if not users:
+            del self.mesh_users[mesh_key]
+            exported_mesh = self.exported_meshes.get(mesh_key)
+            if exported_mesh:
+                self.outdated_shapes.update(exported_mesh.shape_names)
+                self.outdated_shapes.update(exported_mesh.pointiness_shapes)
+
+    def delete_object(self, obj_key, luxcore_scene):
+        """ Delete an exported object or light from LuxCore and release its mesh. Raises KeyError if unknown. """
+        exported_obj = self.exported_objects.pop(obj_key)
+        exported_obj.delete(luxcore_scene)
+        self._release_mesh(exported_obj, obj_key)
+
+    def remove_unused_meshes(self, luxcore_scene):
+        """
+        Delete the geometry of meshes without users from LuxCore.
+        Has to be called after the object definitions of an update were parsed, otherwise
+        LuxCore would also delete the meshes that were just defined for new objects.
+        """
+        if not self.outdated_shapes:
+            return
+        self.outdated_shapes.clear()
+        luxcore_scene.RemoveUnusedMeshes()
+
+        # LuxCore deleted all shapes that are not used by an object, this includes the source
+        # shapes of pointiness shapes and pointiness shapes whose users changed their material
+        used_shapes = {part.lux_shape for exported_obj in self.exported_objects.values()
+                       if isinstance(exported_obj, ExportedObject) for part in exported_obj.parts}
+        for mesh_key, exported_mesh in list(self.exported_meshes.items()):
+            if not exported_mesh:
+                continue
+            if mesh_key not in self.mesh_users:
+                del self.exported_meshes[mesh_key]
+                continue
+
+            exported_mesh.pointiness_shapes.intersection_update(used_shapes)
+            if not used_shapes.issuperset(exported_mesh.shape_names):
+                # Keep it for the users and the stats, but new users have to convert the mesh again
+                exported_mesh.is_complete = False
+
+    def get_mesh_stats(self):
+        """ Returns the number, triangle count and estimated memory of the meshes that are in use """
+        live_meshes = [self.exported_meshes.get(mesh_key) for mesh_key in self.mesh_users]
+        live_meshes = [exported_mesh for exported_mesh in live_meshes if exported_mesh]
+        return (len(live_meshes),
+                sum(exported_mesh.triangle_count for exported_mesh in live_meshes),
+                sum(exported_mesh.memory for exported_mesh in live_meshes))
 
 
     def diff(self, depsgraph):
@@ -197,7 +460,7 @@ class ObjectCache2:
                         transform = None  # In viewport render, everything is instanced
                         exported_mesh = mesh_converter.convert(obj, mesh_key, depsgraph, luxcore_scene,
                                                                is_viewport_render, use_instancing, transform)
-                        self.exported_meshes[mesh_key] = exported_mesh
+                        self._set_exported_mesh(mesh_key, exported_mesh)
 
                         # We arrive here not only when the mesh is edited, but also when the material
                         # of the object is changed in Blender. In this case we have to re-define all
@@ -211,43 +474,168 @@ class ObjectCache2:
                             self.exported_objects[obj_key] = exported_stuff
                             scene_props.Set(props)
 
-        # TODO maybe not loop over all instances, instead only loop over updated
-        #  objects and check if they have a particle system that needs to be updated?
-        #  Would be better for performance with many particles, however I'm not sure
-        #  we can find all instances corresponding to one particle system?
+        if not redefine_objs_with_these_mesh_keys and self._update_transforms(exporter, depsgraph, luxcore_scene,
+                                                                              scene_props, is_viewport_render):
+            # Only transformations were changed, no need to loop over all instances
+            self._debug_info()
+            return
 
-        # Currently, every update that doesn't require a mesh re-export happens here
+        # Every other update that doesn't require a mesh re-export happens here
         for dg_obj_instance in depsgraph.object_instances:
             obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
             if not self._is_visible(dg_obj_instance, obj):
                 continue
 
-            obj_key = utils.make_key_from_instance(dg_obj_instance)
+            obj_key = self.instance_keys.get_key(dg_obj_instance)
             mesh_key = self._get_mesh_key(obj, use_instancing)
 
             if (obj_key in self.exported_objects and obj.type != "LIGHT") and not mesh_key in redefine_objs_with_these_mesh_keys:
                 exported_obj = self.exported_objects[obj_key]
-                updated = False
+                if self._update_object_settings(exported_obj, dg_obj_instance, obj):
+                    scene_props.Set(exported_obj.get_props())
+            else:
+                # Object is new and not in LuxCore yet, or it is a light, do a full export
+                # TODO use luxcore_scene.DuplicateObjects for instances
+                self._convert_obj(exporter, dg_obj_instance, obj, depsgraph,
+                                  luxcore_scene, scene_props, is_viewport_render)
+
+        self._debug_info()
 
-                if exported_obj.transform != dg_obj_instance.matrix_world:
-                    exported_obj.transform = dg_obj_instance.matrix_world.copy()
-                    updated = True
+    def _add_to_reverse_index(self, dg_obj_instance, obj_key):
+        blender_obj_keys = [utils.make_key(dg_obj_instance.object)]
+        if dg_obj_instance.is_instance:
+            blender_obj_keys.append(utils.make_key(dg_obj_instance.parent))
+
+        for blender_obj_key in blender_obj_keys:
+            self.obj_keys_by_blender_obj.setdefault(blender_obj_key, set()).add(obj_key)
+
+    def _update_transforms(self, exporter, depsgraph, luxcore_scene, scene_props, is_viewport_render):
+        """
+        Fast path for updates where only object transformations changed (e.g. moving an object).
+        Only the updated objects are touched, found via the reverse index.
+        Returns False without changing anything if the update can't be handled this way.
+        """
+        updated_objs = []
+
+        for dg_update in depsgraph.updates:
+            datablock = dg_update.id
+
+            if isinstance(datablock, bpy.types.Collection):
+                # Objects might have been added, removed or instanced
+                return False
+            if not isinstance(datablock, bpy.types.Object):
+                continue
+
+            obj = datablock
+            if dg_update.is_updated_geometry and obj.type != "LIGHT":
+                return False
+            if not dg_update.is_updated_transform:
+                # Could be a change of e.g. the object ID or camera visibility, or a light
+                # whose geometry update was already handled above
+                if obj.type == "LIGHT" and dg_update.is_updated_geometry:
+                    continue
+                return False
+            if obj.is_instancer or obj.particle_systems:
+                # Moving the object moves the generated instances or the hair
+                return False
+
+            obj_key = utils.make_key(obj)
+            exported_keys = self.obj_keys_by_blender_obj.get(obj_key, set()) & self.exported_objects.keys()
+            if exported_keys != {obj_key}:
+                # Not exported yet, or also instanced somewhere else
+                return False
+
+            updated_objs.append((obj, obj_key))
+
+        for obj, obj_key in updated_objs:
+            exported_obj = self.exported_objects[obj_key]
+
+            if obj.type == "LIGHT":
+                props, exported_stuff = light.convert_light(exporter, obj, obj_key, depsgraph, luxcore_scene,
+                                                            obj.matrix_world.copy(), is_viewport_render)
+                if exported_stuff:
+                    self.exported_objects[obj_key] = exported_stuff
+                    scene_props.Set(props)
+            elif exported_obj.transform != obj.matrix_world:
+                exported_obj.transform = obj.matrix_world.copy()
+                scene_props.Set(exported_obj.get_props())
+
+        return True
 
-                obj_id = utils.make_object_id(dg_obj_instance)
-                if exported_obj.obj_id != obj_id:
-                    exported_obj.obj_id = obj_id
-                    updated = True
+    def _update_object_settings(self, exported_obj, dg_obj_instance, obj):
+        """ Update transformation, object ID and camera visibility. Returns True if anything changed. """
+        updated = False
 
-                if exported_obj.visible_to_camera != obj.luxcore.visible_to_camera:
-                    exported_obj.visible_to_camera = obj.luxcore.visible_to_camera
-                    updated = True
+        if exported_obj.transform != dg_obj_instance.matrix_world:
+            exported_obj.transform = dg_obj_instance.matrix_world.copy()
+            updated = True
 
-                if updated:
+        obj_id = self.instance_keys.get_object_id(dg_obj_instance)
+        if exported_obj.obj_id != obj_id:
+            exported_obj.obj_id = obj_id
+            updated = True
+
+        if exported_obj.visible_to_camera != obj.luxcore.visible_to_camera:
+            exported_obj.visible_to_camera = obj.luxcore.visible_to_camera
+            updated = True
+
+        return updated
+
+    def update_animation_frame(self, exporter, depsgraph, view_layer, engine, luxcore_scene, scene_props):
+        """
+        Bring the exported objects up to date with the current frame of an animation
+        render with persistent data. Returns False if the export was cancelled.
+        """
+        visible_keys = set()
+        reexported_mesh_keys = set()
+
+        for index, dg_obj_instance in enumerate(depsgraph.object_instances, start=1):
+            obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
+            if not (self._is_visible(dg_obj_instance, obj) or obj.visible_get(view_layer=view_layer)):
+                continue
+
+            obj_key = self.instance_keys.get_key(dg_obj_instance)
+            visible_keys.add(obj_key)
+            exported_obj = self.exported_objects.get(obj_key)
+            changes_over_time = obj.type in MESH_OBJECTS and self._changes_over_time(obj)
+
+            if obj.type in MESH_OBJECTS and isinstance(exported_obj, ExportedObject) and not changes_over_time:
+                # Only the transformation and object settings can have changed
+                if self._update_object_settings(exported_obj, dg_obj_instance, obj):
                     scene_props.Set(exported_obj.get_props())
             else:
-                # Object is new and not in LuxCore yet, or it is a light, do a full export
-                # TODO use luxcore_scene.DuplicateObjects for instances
+                if changes_over_time:
+                    mesh_key = self._get_mesh_key(obj, use_instancing=True, is_viewport_render=False)
+                    if mesh_key not in reexported_mesh_keys:
+                        # The mesh can be used by several instances, only re-export it once per frame
+                        old_mesh = self.exported_meshes.pop(mesh_key, None)
+                        if old_mesh:
+                            # Shapes that are not defined again are deleted by remove_unused_meshes()
+                            self.outdated_shapes.update(old_mesh.shape_names)
+                            self.outdated_shapes.update(old_mesh.pointiness_shapes)
+                        reexported_mesh_keys.add(mesh_key)
+
+                # New objects, lights and objects with changing geometry are exported again
                 self._convert_obj(exporter, dg_obj_instance, obj, depsgraph,
-                                  luxcore_scene, scene_props, is_viewport_render)
+                                  luxcore_scene, scene_props, is_viewport_render=False)
+
+            if engine and index % 1000 == 0 and engine.test_break():
+                return False
+
+        # Delete objects that are not visible anymore
+        for obj_key in self.exported_objects.keys() - visible_keys:
+            self.delete_object(obj_key, luxcore_scene)
 
         self._debug_info()
+        return True
+
+    def _changes_over_time(self, obj):
+        """ Check if the geometry or the hair of a mesh object might be different in every frame """
+        original = obj.original
+        if utils.has_deforming_modifiers(original):
+            return True
+        if original.data and original.data.animation_data:
+            return True
+        if original.type == "MESH" and original.data.shape_keys:
+            return True
+        return any(psys.settings.type == "HAIR" for psys in obj.particle_systems)
@@ -1,20 +1,23 @@
 from ..bin import pyluxcore
 from .. import utils
 from . import blender_object
+import numpy as np
 from time import time
 from array import array
+from itertools import chain
 from ..utils.errorlog import LuxCoreErrorLog
 
 
 class Duplis:
     def __init__(self, exported_obj, matrix, object_id):
         self.exported_obj = exported_obj
-        self.matrices = matrix
+        # Rows first, all matrices are converted in one batch by utils.matrices_to_array()
+        self.matrices = array("f", chain.from_iterable(matrix))
         self.object_ids = [object_id]
         self.count = 1
 
     def add(self, matrix, object_id):
-        self.matrices += matrix
+        self.matrices.extend(chain.from_iterable(matrix))
         self.object_ids.append(object_id)
         self.count += 1
 
@@ -57,7 +60,6 @@ def convert(exporter, duplicator, scene, context, luxcore_scene, engine=None):
 
             # Use the utils functions to build names so linked objects work (libraries)
             name = name_prefix + utils.get_luxcore_name(dupli.object, context)
-            matrix_list = utils.matrix_to_list(dupli.matrix, scene, apply_worldscale=True)
 
             if dupli.object.type == "LIGHT":
                 name_suffix = _get_name_suffix(name_prefix, dupli, context)
@@ -73,7 +75,7 @@ def convert(exporter, duplicator, scene, context, luxcore_scene, engine=None):
 
                 try:
                     # Already exported, just update the Duplis info
-                    exported_duplis[name].add(matrix_list, object_id)
+                    exported_duplis[name].add(dupli.matrix, object_id)
                 except KeyError:
                     # Not yet exported
                     name_suffix = _get_name_suffix(name_prefix, dupli, context)
@@ -81,7 +83,7 @@ def convert(exporter, duplicator, scene, context, luxcore_scene, engine=None):
                                                                      luxcore_scene, update_mesh=True,
                                                                      dupli_suffix=name_suffix, duplicator=duplicator)
                     dupli_props.Set(obj_props)
-                    exported_duplis[name] = Duplis(exported_obj, matrix_list, object_id)
+                    exported_duplis[name] = Duplis(exported_obj, dupli.matrix, object_id)
 
             # Report progress and check if user wants to cancel export
             # Note: in viewport render we can't do all this, so we don't pass the engine there
@@ -111,12 +113,13 @@ def convert(exporter, duplicator, scene, context, luxcore_scene, engine=None):
             if exported_obj:
                 # exported_objects should only contain instances of ExportedObject
                 assert isinstance(exported_obj, utils.ExportedObject)
+                transformations = utils.matrices_to_array(np.frombuffer(duplis.matrices, dtype=np.float32),
+                                                          dtype=np.float32)
 
                 # Objects might be split if they have multiple materials
                 for src_name in exported_obj.luxcore_names:
                     dst_name = src_name + "dupli"
                     count = duplis.count
-                    transformations = array("f", duplis.matrices)
                     object_ids = array("I", duplis.object_ids)
                     luxcore_scene.DuplicateObject(src_name, dst_name, count, transformations, object_ids)
 
@@ -6,6 +6,12 @@ from .image import ImageExporter
 from time import time
 from ..utils.errorlog import LuxCoreErrorLog
 
+# How many strands are processed between two progress updates/cancel checks
+STRAND_CHUNK_SIZE = 10000
+# Returned by _interpolate_hair_keys() if the export was cancelled, None means the fast path can't be used
+_CANCELLED = object()
+
+
 def find_psys_modifier(obj, psys):
     for mod in obj.modifiers:
         if mod.type == "PARTICLE_SYSTEM" and mod.particle_system.name == psys.name:
@@ -33,13 +39,13 @@ def convert_uvs(obj, psys, settings, uv_textures, engine, strands_count, start,
 
     first_particle = psys.particles[0]
     f = psys.uv_on_emitter
-    uvs = np.fromiter((elem
-                       for i in range(start, dupli_count)
-                       for elem in f(mod, particle=psys.particles[i] if num_children == 0 else first_particle,
-                                     particle_no=i, uv_no=uv_index)),
-                      dtype=np.float32,
-                      count=(dupli_count - start) * 2)
-    return uvs
+
+    def get_strand_uvs(i):
+        return f(mod, particle=psys.particles[i] if num_children == 0 else first_particle,
+                 particle_no=i, uv_no=uv_index)
+
+    msg = "[%s: %s] Preparing UV coordinates" % (obj.name, psys.name)
+    return _fromiter_chunked(get_strand_uvs, start, dupli_count, 2, engine, msg)
 
 def convert_colors(obj, psys, settings, vertex_colors, engine, strands_count, start, dupli_count, mod, num_children):
     failure = np.empty(shape=0, dtype=np.float32)
@@ -62,13 +68,148 @@ def convert_colors(obj, psys, settings, vertex_colors, engine, strands_count, st
 
     first_particle = psys.particles[0]
     f = psys.mcol_on_emitter
-    colors = np.fromiter((elem
-                          for i in range(start, dupli_count)
-                          for elem in f(mod, psys.particles[i] if num_children == 0 else first_particle,
-                                        particle_no= i, vcol_no=vertex_color_index)),
-                         dtype=np.float32,
-                         count=(dupli_count - start) * 3)
-    return colors
+
+    def get_strand_color(i):
+        return f(mod, psys.particles[i] if num_children == 0 else first_particle,
+                 particle_no=i, vcol_no=vertex_color_index)
+
+    msg = "[%s: %s] Preparing vertex colors" % (obj.name, psys.name)
+    return _fromiter_chunked(get_strand_color, start, dupli_count, 3, engine, msg)
+
+
+def convert_points(obj, psys, engine, start, dupli_count, points_per_strand, num_children):
+    """
+    Returns the strand points in world space as flattened numpy array,
+    or None if the export was cancelled by the user.
+    """
+    if num_children == 0 and not psys.use_hair_dynamics and not psys.settings.use_hair_bspline:
+        points = _interpolate_hair_keys(obj, psys, engine, points_per_strand)
+        if points is _CANCELLED:
+            return None
+        if points is not None:
+            return points
+
+    return read_path_cache(obj, psys, engine, start, dupli_count, points_per_strand)
+
+
+def read_path_cache(obj, psys, engine, start, dupli_count, points_per_strand):
+    """
+    Slow path: ask Blender for each point of the path cache.
+    Returns the points like convert_points(), or None if the export was cancelled by the user.
+    """
+    co_hair = psys.co_hair
+
+    def get_strand_points(pindex):
+        for step in range(points_per_strand):
+            yield from co_hair(object=obj, particle_no=pindex, step=step)
+
+    msg = "[%s: %s] Preparing points" % (obj.name, psys.name)
+    return _fromiter_chunked(get_strand_points, start, dupli_count, points_per_strand * 3, engine, msg)
+
+
+def _interpolate_hair_keys(obj, psys, engine, points_per_strand):
+    """
+    Fast path for parent hair without dynamics: read the hair keys with foreach_get
+    and interpolate them like Blender does for the path cache (cardinal spline).
+    Returns None if the keys can't be used (e.g. different key counts per strand),
+    or _CANCELLED if the export was cancelled by the user.
+    """
+    particles = psys.particles
+    strand_count = len(particles)
+    key_count = len(particles[0].hair_keys)
+    if key_count < 2:
+        return None
+
+    # Hair key coordinates are in object space
+    cos = np.empty((strand_count, key_count * 3), dtype=np.float32)
+    times = np.empty((strand_count, key_count), dtype=np.float32)
+
+    for i, particle in enumerate(particles):
+        hair_keys = particle.hair_keys
+        if len(hair_keys) != key_count:
+            return None
+        hair_keys.foreach_get("co", cos[i])
+        hair_keys.foreach_get("time", times[i])
+
+        if engine and i % STRAND_CHUNK_SIZE == 0:
+            engine.update_stats("Exporting...", "[%s: %s] Reading hair keys (%d%%)"
+                                % (obj.name, psys.name, i / strand_count * 100))
+            if engine.test_break():
+                return _CANCELLED
+
+    cos = cos.reshape((strand_count, key_count, 3))
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    points = np.empty((strand_count, points_per_strand, 3), dtype=np.float32)
+
+    for chunk_start in range(0, strand_count, STRAND_CHUNK_SIZE):
+        chunk = slice(chunk_start, min(chunk_start + STRAND_CHUNK_SIZE, strand_count))
+        chunk_points = _interpolate_cardinal(cos[chunk], times[chunk], points_per_strand)
+        # Transform to world space
+        points[chunk] = chunk_points @ matrix[:3, :3].T + matrix[:3, 3]
+
+    return points.ravel()
+
+
+def _interpolate_cardinal(cos, times, points_per_strand):
+    """
+    Vectorized version of Blender's hair path interpolation (KEY_CARDINAL in psys_interpolate_particle).
+    cos has shape (strands, keys, 3), times has shape (strands, keys).
+    Returns an array with shape (strands, points_per_strand, 3).
+    """
+    strand_count, key_count = times.shape
+    t = np.linspace(0, 1, points_per_strand, dtype=np.float32)
+    real_t = times[:, :1] + (times[:, -1:] - times[:, :1]) * t
+
+    # Index of the first key after real_t, the interpolated segment is [i0, i1]
+    i1 = np.clip((times[:, np.newaxis, :] < real_t[:, :, np.newaxis]).sum(axis=2), 1, key_count - 1)
+    i0 = i1 - 1
+    # The outer keys are clamped at the strand ends
+    k0 = np.maximum(i0 - 1, 0)
+    k3 = np.minimum(i1 + 1, key_count - 1)
+
+    rows = np.arange(strand_count)[:, np.newaxis]
+    t0 = times[rows, i0]
+    dt = times[rows, i1] - t0
+    keytime = np.divide(real_t - t0, dt, out=np.zeros_like(real_t), where=dt > 0)
+
+    fc = 0.71
+    t2 = keytime * keytime
+    t3 = t2 * keytime
+    weights = (
+        -fc * t3 + 2 * fc * t2 - fc * keytime,
+        (2 - fc) * t3 + (fc - 3) * t2 + 1,
+        (fc - 2) * t3 + (3 - 2 * fc) * t2 + fc * keytime,
+        fc * t3 - fc * t2,
+    )
+
+    result = np.zeros((strand_count, points_per_strand, 3), dtype=np.float32)
+    for weight, index in zip(weights, (k0, i0, i1, k3)):
+        result += weight[:, :, np.newaxis] * cos[rows, index]
+    return result
+
+
+def _fromiter_chunked(func, start, end, width, engine, msg):
+    """
+    Collect the values returned by func(index) for all indices in range(start, end)
+    into a flattened float32 array. Each call has to return exactly width values.
+    Progress is reported and cancellation is checked after each chunk of strands.
+    Returns None if the export was cancelled by the user.
+    """
+    result = np.empty((end - start) * width, dtype=np.float32)
+
+    for chunk_start in range(start, end, STRAND_CHUNK_SIZE):
+        chunk_end = min(chunk_start + STRAND_CHUNK_SIZE, end)
+        result[(chunk_start - start) * width:(chunk_end - start) * width] = np.fromiter(
+            (elem for i in range(chunk_start, chunk_end) for elem in func(i)),
+            dtype=np.float32,
+            count=(chunk_end - chunk_start) * width)
+
+        if engine:
+            engine.update_stats("Exporting...", "%s (%d%%)" % (msg, (chunk_end - start) / (end - start) * 100))
+            if engine.test_break():
+                return None
+
+    return result
 
 def get_material(obj, material_index, exporter, depsgraph, is_viewport_render):
     from ..utils import node as utils_node
@@ -88,13 +229,15 @@ def get_material(obj, material_index, exporter, depsgraph, is_viewport_render):
 
     if mat:
         if mat.luxcore.node_tree:
-            imagemaps = utils_node.find_nodes(mat.luxcore.node_tree, "LuxCoreNodeTexImagemap")
-            if imagemaps and not utils_node.has_valid_uv_map(obj):
-                msg = (utils.pluralize("%d image texture", len(imagemaps)) + " used, but no UVs defined. "
+            tree_info = utils_node.tree_index.get(mat.luxcore.node_tree)
+            if tree_info.needs_uv_map and not utils_node.has_valid_uv_map(obj):
+                msg = (utils.pluralize("%d image texture", tree_info.imagemap_count) + " used, but no UVs defined. "
                        "In case of bumpmaps this can lead to artifacts")
                 LuxCoreErrorLog.add_warning(msg, obj_name=obj.name)
 
-        return material.convert(exporter, depsgraph, mat, is_viewport_render, obj.name)
+        # The strands are parsed directly into the LuxCore scene, so they need the full definition
+        return material.convert_cached(exporter, depsgraph, mat, is_viewport_render, obj.name,
+                                       include_definition=True)
     else:
         return material.fallback()
 
@@ -150,13 +293,9 @@ def convert_hair(exporter, obj, psys, depsgraph, luxcore_scene, is_viewport_rend
         if engine:
             engine.update_stats("Exporting...", "[%s: %s] Preparing %d points"
                                 % (obj.name, psys.name, point_count))
-        co_hair = psys.co_hair
-        points = np.fromiter((elem
-                              for pindex in range(start, dupli_count)
-                              for step in range(points_per_strand)
-                              for elem in co_hair(object=obj, particle_no=pindex, step=step)),
-                             dtype=np.float32,
-                             count=point_count * 3)
+        points = convert_points(obj, psys, engine, start, dupli_count, points_per_strand, num_children)
+        if points is None:
+            return
 
         colors = np.empty(shape=0, dtype=np.float32)
         uvs = np.empty(shape=0, dtype=np.float32)
@@ -186,6 +325,10 @@ def convert_hair(exporter, obj, psys, depsgraph, luxcore_scene, is_viewport_rend
 
             obj.to_mesh_clear()
 
+        if colors is None or uvs is None:
+            # Cancelled by the user
+            return
+
         if len(uvs) == 0:
             copy_uvs = False
 
@@ -196,6 +339,9 @@ def convert_hair(exporter, obj, psys, depsgraph, luxcore_scene, is_viewport_rend
         luxcore_shape_name = utils.get_luxcore_name(obj, is_viewport_render) + "_" + utils.make_key_from_bpy_struct(
             psys)
 
+        exporter.profiler.add_bytes("HAIR", "%s: %s" % (obj.name, psys.name),
+                                    points.nbytes + colors.nbytes + uvs.nbytes)
+
         if engine:
             engine.update_stats("Exporting...", "Refining Hair System %s" % psys.name)
         success = luxcore_scene.DefineBlenderStrands(luxcore_shape_name, points_per_strand,
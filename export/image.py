@@ -1,14 +1,26 @@
 import bpy
+import hashlib
 import tempfile
 import os
 from .. import utils
 
 
+# Packed and generated images are written to this directory (in the system temp directory),
+# named by a hash of their content, so they can be re-used by later renders and sessions.
+# Each user gets their own directory, see _get_store_dir()
+STORE_DIR_NAME = "luxcore_image_store"
+# When the store grows larger than this, the least recently used files are deleted
+STORE_MAX_SIZE = 4 * 1024**3
+
+
 class ImageExporter(object):
     """
     This class is a singleton
     """
+    # {image_key: filepath} of the images exported in this session
     temp_images = {}
+    # Files that are not part of the image store, they are deleted on exit
+    session_files = set()
 
     @classmethod
     def _save_to_temp_file(cls, image):
@@ -16,33 +28,40 @@ class ImageExporter(object):
 
         if key in cls.temp_images:
             # Image was already exported
-            temp_image = cls.temp_images[key]
+            return cls.temp_images[key]
+
+        if image.filepath_raw:
+            _, extension = os.path.splitext(image.filepath_raw)
         else:
-            if image.filepath_raw:
-                _, extension = os.path.splitext(image.filepath_raw)
-            else:
-                # Generated images do not have a filepath, fallback to file_format
-                extension = "." + image.file_format.lower()
+            # Generated images do not have a filepath, fallback to file_format
+            extension = "." + image.file_format.lower()
 
-            temp_image = tempfile.NamedTemporaryFile(delete=False, suffix=extension)
+        content_hash = _get_content_hash(image)
 
-            print('Unpacking image "%s" to temp file "%s"' % (image.name, temp_image.name))
-            orig_filepath = image.filepath_raw
-            orig_source = image.source
-            image.filepath_raw = temp_image.name
+        if content_hash:
+            filepath = os.path.join(_get_store_dir(), content_hash + extension)
 
-            try:
-                image.save()
-            except RuntimeError as error:
-                raise OSError(str(error))
-            finally:
-                # The changes above altered the source to "FILE", so we have to restore the original source
-                image.filepath_raw = orig_filepath
-                image.source = orig_source
+            if os.path.isfile(filepath):
+                print('Re-using image "%s" from image store "%s"' % (image.name, filepath))
+                # Mark as recently used, for the eviction
+                os.utime(filepath)
+            else:
+                print('Unpacking image "%s" to image store "%s"' % (image.name, filepath))
+                _write_image(image, filepath)
+                _evict_from_store(keep=set(cls.temp_images.values()) | {filepath})
+        else:
+            # Modified images can't be identified without reading all their pixels
+            temp_image = tempfile.NamedTemporaryFile(delete=False, suffix=extension)
+            temp_image.close()
+            filepath = temp_image.name
+            cls.session_files.add(filepath)
+
+            print('Unpacking image "%s" to temp file "%s"' % (image.name, filepath))
+            _write_image(image, filepath)
 
         # Only store the key once we are sure that everything went OK
-        cls.temp_images[key] = temp_image
-        return temp_image.name
+        cls.temp_images[key] = filepath
+        return filepath
 
     @classmethod
     def export(cls, image, image_user, scene):
@@ -101,9 +120,114 @@ class ImageExporter(object):
 
     @classmethod
     def cleanup(cls):
-        for temp_image in cls.temp_images.values():
-            print("Deleting temporary image:", temp_image.name)
-            os.remove(temp_image.name)
+        for filepath in cls.session_files:
+            print("Deleting temporary image:", filepath)
+            if os.path.exists(filepath):
+                os.remove(filepath)
 
         cls.temp_images = {}
+        cls.session_files = set()
+        # Files in the store are kept for the next session, as long as the store is not too large
+        try:
+            _evict_from_store(keep=set())
+        except OSError as error:
+            print("Could not clean up image store:", error)
+
+
+def _get_store_dir():
+    """
+    Files in the store are trusted by their name, so other users must not be able to write to it.
+    On Windows, the temp directory is already per user.
+    """
+    if not hasattr(os, "getuid"):
+        store_dir = os.path.join(tempfile.gettempdir(), STORE_DIR_NAME)
+        os.makedirs(store_dir, exist_ok=True)
+        return store_dir
+
+    uid = os.getuid()
+    store_dir = os.path.join(tempfile.gettempdir(), "%s_%d" % (STORE_DIR_NAME, uid))
+    os.makedirs(store_dir, mode=0o700, exist_ok=True)
+
+    # The directory might have been created by someone else before
+    stat = os.lstat(store_dir)
+    if not os.path.isdir(store_dir) or os.path.islink(store_dir) or stat.st_uid != uid or stat.st_mode & 0o077:
+        raise OSError('Image store "%s" is not a private directory of the current user' % store_dir)
+    return store_dir
+
+
+def _get_content_hash(image):
+    """ Returns a hash identifying the image content, or None if the image was modified in Blender """
+    if image.is_dirty:
+        return None
+
+    if image.packed_file:
+        # The packed data is the original image file
+        hasher = hashlib.sha1(b"packed")
+        hasher.update(image.packed_file.data)
+    elif image.source == "GENERATED":
+        hasher = hashlib.sha1(b"generated")
+        params = (image.generated_type, image.generated_width, image.generated_height,
+                  tuple(image.generated_color), image.use_generated_float,
+                  image.file_format, image.colorspace_settings.name)
+        hasher.update(repr(params).encode("utf-8"))
+    else:
+        return None
+
+    return hasher.hexdigest()
+
+
+def _write_image(image, filepath):
+    # Write to a temporary file first, so other Blender instances never read a half-written file
+    temp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+
+    if image.packed_file and not image.is_dirty:
+        # No need to decode and encode the image again
+        with open(temp_filepath, "wb") as f:
+            f.write(image.packed_file.data)
+    else:
+        orig_filepath = image.filepath_raw
+        orig_source = image.source
+        image.filepath_raw = temp_filepath
+
+        try:
+            image.save()
+        except RuntimeError as error:
+            raise OSError(str(error))
+        finally:
+            # The changes above altered the source to "FILE", so we have to restore the original source
+            image.filepath_raw = orig_filepath
+            image.source = orig_source
+
+    os.replace(temp_filepath, filepath)
+
+
+def _evict_from_store(keep):
+    """ Delete the least recently used files until the store is smaller than STORE_MAX_SIZE """
+    store_dir = _get_store_dir()
+    entries = []
+    total_size = 0
+
+    for name in os.listdir(store_dir):
+        filepath = os.path.join(store_dir, name)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            # Deleted by another Blender instance in the meantime
+            continue
+        entries.append((stat.st_mtime, stat.st_size, filepath))
+        total_size += stat.st_size
+
+    entries.sort()
+    for mtime, size, filepath in entries:
+        if total_size <= STORE_MAX_SIZE:
+            break
+        if filepath in keep:
+            continue
+
+        print("Deleting image from image store:", filepath)
+        try:
+            os.remove(filepath)
+            total_size -= size
+        except OSError:
+            pass
 
@@ -192,7 +192,7 @@ def convert_luxcore_settings(exporter, obj, obj_key, depsgraph, luxcore_scene, t
     if not is_viewport_render and definitions["type"] in TYPES_SUPPORTING_ENVLIGHTCACHE:
         _envlightcache(definitions, light, scene)
 
-    props = utils.create_props(prefix, definitions)
+    props = utils.create_props_bulk(prefix, definitions)
     return props, exported_light
 
 
@@ -441,7 +441,7 @@ def _convert_area_light(obj, scene, is_viewport_render, exporter, depsgraph, lux
         # Use instancing for viewport render so we can interactively move the light
         obj_definitions["transformation"] = obj_transform
 
-    obj_props = utils.create_props(obj_prefix, obj_definitions)
+    obj_props = utils.create_props_bulk(obj_prefix, obj_definitions)
     props.Set(obj_props)
 
     mesh_definition = [luxcore_name, fake_material_index]
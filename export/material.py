@@ -44,6 +44,29 @@ def convert(exporter, depsgraph, material, is_viewport_render, obj_name=""):
         return fallback()
 
 
+def convert_cached(exporter, depsgraph, material, is_viewport_render, obj_name="", include_definition=False):
+    """
+    Like convert(), but each material is only converted once per export session.
+    If the material was already converted, the returned properties are empty
+    because the material definition was already emitted.
+    Callers that parse directly into the LuxCore scene have to set include_definition,
+    because the first definition might still wait in the scene properties.
+    """
+    if material is None:
+        return fallback()
+
+    key = (utils.make_key(material), is_viewport_render)
+
+    try:
+        luxcore_name, props = exporter.material_conversion_cache[key]
+        return luxcore_name, props if include_definition else pyluxcore.Properties()
+    except KeyError:
+        with exporter.profiler.measure("MATERIAL", material.name):
+            luxcore_name, props = convert(exporter, depsgraph, material, is_viewport_render, obj_name)
+        exporter.material_conversion_cache[key] = (luxcore_name, props)
+        return luxcore_name, props
+
+
 def fallback(luxcore_name=GLOBAL_FALLBACK_MAT):
     props = pyluxcore.Properties()
     props.SetFromString("""
@@ -0,0 +1,265 @@
+import os
+import hashlib
+import bpy
+import numpy as np
+from ..bin import pyluxcore
+from .. import utils
+from .caches.exported_data import ExportedMesh
+
+# Increment when the file layout changes, so old cache files are not used anymore
+CACHE_VERSION = 2
+
+# {pointer: count} of original objects and meshes, counts the depsgraph updates of their geometry
+_revisions = {}
+# Meshes whose geometry only depends on their datablocks, so they don't have to be evaluated
+# and hashed again until they are edited: {(object pointer, mesh pointer): (state, StaticMesh)}
+_static_meshes = {}
+
+
+class StaticMesh:
+    def __init__(self, digest, mat_indices, triangle_count, memory):
+        self.digest = digest
+        self.mat_indices = mat_indices
+        self.triangle_count = triangle_count
+        self.memory = memory
+
+
+def get_cache_dir(scene, is_viewport_render):
+    """ Returns the absolute path of the mesh cache directory, or None if the cache is not used """
+    config = scene.luxcore.config
+    if is_viewport_render or not config.use_mesh_cache:
+        return None
+
+    if not config.mesh_cache_path:
+        raise OSError("Mesh cache enabled, but no cache directory set")
+
+    cache_dir = utils.get_abspath(config.mesh_cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def tag_updates(depsgraph):
+    """ Called after each depsgraph update, marks the static meshes of edited datablocks as outdated """
+    for update in depsgraph.updates:
+        datablock = update.id
+        if isinstance(datablock, bpy.types.Mesh) or (isinstance(datablock, bpy.types.Object)
+                                                     and update.is_updated_geometry):
+            pointer = datablock.original.as_pointer()
+            _revisions[pointer] = _revisions.get(pointer, 0) + 1
+
+
+def reset():
+    """
+    Called after loading a .blend file and after undo/redo, the datablock pointers are no longer valid.
+    Also called after depsgraph updates whose changed datablocks are unknown.
+    """
+    _revisions.clear()
+    _static_meshes.clear()
+
+
+def convert_static(obj, mesh_key, luxcore_scene, mesh_transform, cache_dir):
+    """
+    Define the shapes of an unmodified mesh from the cache without evaluating it.
+    Returns None if the mesh is not static, was edited since it was cached or its files are missing,
+    in this case the mesh has to be evaluated and passed to convert().
+    """
+    key, state = _get_static_state(obj)
+    if key is None:
+        return None
+
+    cached_state, static_mesh = _static_meshes.get(key, (None, None))
+    if cached_state != state:
+        return None
+
+    filepaths = [_get_filepath(cache_dir, static_mesh.digest, mat_index) for mat_index in static_mesh.mat_indices]
+    if not all(os.path.isfile(filepath) for filepath in filepaths):
+        return None
+
+    exported_mesh = _define_shapes(mesh_key, luxcore_scene, mesh_transform, static_mesh.mat_indices, filepaths)
+    exported_mesh.triangle_count = static_mesh.triangle_count
+    exported_mesh.memory = static_mesh.memory
+    return exported_mesh
+
+
+def convert(obj, mesh, mesh_key, luxcore_scene, mesh_transform, cache_dir, size):
+    """
+    Define the shapes of the mesh from PLY files in the cache directory.
+    The files are named by a hash of the evaluated geometry, so they are only
+    written if no other export (previous frame, re-render) has written them yet.
+    mesh_transform is a flattened matrix (baked into the shapes by LuxCore) or None.
+    size is the (triangle count, memory) estimation of the mesh.
+    """
+    buffers = _read_buffers(mesh)
+    digest = _hash_buffers(buffers)
+    material_count = max(1, len(mesh.materials))
+    tri_materials = np.minimum(buffers["tri_materials"], material_count - 1)
+
+    mat_indices = []
+    filepaths = []
+
+    for mat_index in range(material_count):
+        tri_mask = tri_materials == mat_index
+        if not tri_mask.any():
+            continue
+
+        filepath = _get_filepath(cache_dir, digest, mat_index)
+        if not os.path.isfile(filepath):
+            _write_ply(filepath, buffers, tri_mask)
+        mat_indices.append(mat_index)
+        filepaths.append(filepath)
+
+    key, state = _get_static_state(obj)
+    if key is not None:
+        _static_meshes[key] = (state, StaticMesh(digest, mat_indices, *size))
+
+    exported_mesh = _define_shapes(mesh_key, luxcore_scene, mesh_transform, mat_indices, filepaths)
+    exported_mesh.triangle_count, exported_mesh.memory = size
+    return exported_mesh
+
+
+def _get_static_state(obj):
+    """
+    Returns the key and the state of the object in the static mesh index, or (None, None)
+    if the evaluated mesh can change without an update of the object or mesh datablock
+    (modifiers, shape keys, animated mesh properties). The state only contains cheap inputs.
+    """
+    original = obj.original
+    mesh = original.data
+    if (original.type != "MESH" or mesh.shape_keys or mesh.animation_data
+            or any(modifier.show_render for modifier in original.modifiers)):
+        return None, None
+
+    obj_pointer = original.as_pointer()
+    mesh_pointer = mesh.as_pointer()
+    state = (original.name_full, mesh.name_full, _revisions.get(obj_pointer, 0),
+             _revisions.get(mesh_pointer, 0), len(original.material_slots))
+    return (obj_pointer, mesh_pointer), state
+
+
+def _get_filepath(cache_dir, digest, mat_index):
+    return os.path.join(cache_dir, "%s_%d.ply" % (digest, mat_index))
+
+
+def _define_shapes(mesh_key, luxcore_scene, mesh_transform, mat_indices, filepaths):
+    props = pyluxcore.Properties()
+    mesh_definitions = []
+
+    for mat_index, filepath in zip(mat_indices, filepaths):
+        # Same naming scheme as DefineBlenderMesh
+        shape_name = "%s%03d" % (mesh_key, mat_index)
+        prefix = "scene.shapes." + shape_name + "."
+        props.Set(pyluxcore.Property(prefix + "type", "mesh"))
+        props.Set(pyluxcore.Property(prefix + "ply", filepath))
+        if mesh_transform:
+            props.Set(pyluxcore.Property(prefix + "transformation", mesh_transform))
+        mesh_definitions.append([shape_name, mat_index])
+
+    luxcore_scene.Parse(props)
+    return ExportedMesh(mesh_definitions)
+
+
+def _read_buffers(mesh):
+    vert_count = len(mesh.vertices)
+    loop_count = len(mesh.loops)
+    poly_count = len(mesh.polygons)
+    tri_count = len(mesh.loop_triangles)
+
+    buffers = {
+        "vert_cos": np.empty(vert_count * 3, dtype=np.float32),
+        "vert_normals": np.empty(vert_count * 3, dtype=np.float32),
+        "loop_verts": np.empty(loop_count, dtype=np.int32),
+        "poly_loop_totals": np.empty(poly_count, dtype=np.int32),
+        "poly_normals": np.empty(poly_count * 3, dtype=np.float32),
+        "poly_smooth": np.empty(poly_count, dtype=np.bool_),
+        "tri_loops": np.empty(tri_count * 3, dtype=np.int32),
+        "tri_materials": np.empty(tri_count, dtype=np.int32),
+    }
+
+    mesh.vertices.foreach_get("co", buffers["vert_cos"])
+    mesh.vertices.foreach_get("normal", buffers["vert_normals"])
+    mesh.loops.foreach_get("vertex_index", buffers["loop_verts"])
+    mesh.polygons.foreach_get("loop_total", buffers["poly_loop_totals"])
+    mesh.polygons.foreach_get("normal", buffers["poly_normals"])
+    mesh.polygons.foreach_get("use_smooth", buffers["poly_smooth"])
+    mesh.loop_triangles.foreach_get("loops", buffers["tri_loops"])
+    mesh.loop_triangles.foreach_get("material_index", buffers["tri_materials"])
+
+    if mesh.has_custom_normals:
+        mesh.calc_normals_split()
+        buffers["loop_normals"] = np.empty(loop_count * 3, dtype=np.float32)
+        mesh.loops.foreach_get("normal", buffers["loop_normals"])
+
+    # Like mesh_converter.convert(), only the first layer is exported
+    if mesh.uv_layers:
+        buffers["loop_uvs"] = np.empty(loop_count * 2, dtype=np.float32)
+        mesh.uv_layers[0].data.foreach_get("uv", buffers["loop_uvs"])
+
+    if mesh.vertex_colors:
+        buffers["loop_colors"] = np.empty(loop_count * 4, dtype=np.float32)
+        mesh.vertex_colors[0].data.foreach_get("color", buffers["loop_colors"])
+
+    return buffers
+
+
+def _hash_buffers(buffers):
+    hasher = hashlib.sha1(b"v%d" % CACHE_VERSION)
+    for name in sorted(buffers.keys()):
+        hasher.update(name.encode("utf-8"))
+        hasher.update(buffers[name].tobytes())
+    return hasher.hexdigest()
+
+
+def _write_ply(filepath, buffers, tri_mask):
+    """ Write the triangles selected by tri_mask as binary PLY file, with one vertex per used loop """
+    tri_loops = buffers["tri_loops"].reshape((-1, 3))[tri_mask]
+    used_loops, triangles = np.unique(tri_loops, return_inverse=True)
+    triangles = triangles.reshape((-1, 3))
+
+    vert_indices = buffers["loop_verts"][used_loops]
+    loop_polys = np.repeat(np.arange(len(buffers["poly_loop_totals"])), buffers["poly_loop_totals"])[used_loops]
+
+    if "loop_normals" in buffers:
+        normals = buffers["loop_normals"].reshape((-1, 3))[used_loops]
+    else:
+        # Smooth faces use the vertex normals, flat faces the face normal
+        vert_normals = buffers["vert_normals"].reshape((-1, 3))[vert_indices]
+        poly_normals = buffers["poly_normals"].reshape((-1, 3))[loop_polys]
+        smooth = buffers["poly_smooth"][loop_polys]
+        normals = np.where(smooth[:, np.newaxis], vert_normals, poly_normals)
+
+    vertex_fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4")]
+    if "loop_uvs" in buffers:
+        vertex_fields += [("u", "<f4"), ("v", "<f4")]
+    if "loop_colors" in buffers:
+        vertex_fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+
+    vertices = np.empty(len(used_loops), dtype=vertex_fields)
+    cos = buffers["vert_cos"].reshape((-1, 3))[vert_indices]
+    vertices["x"], vertices["y"], vertices["z"] = cos.T
+    vertices["nx"], vertices["ny"], vertices["nz"] = normals.T
+
+    if "loop_uvs" in buffers:
+        uvs = buffers["loop_uvs"].reshape((-1, 2))[used_loops]
+        vertices["u"], vertices["v"] = uvs.T
+
+    if "loop_colors" in buffers:
+        colors = buffers["loop_colors"].reshape((-1, 4))[used_loops, :3]
+        colors = np.clip(colors * 255 + 0.5, 0, 255).astype(np.uint8)
+        vertices["red"], vertices["green"], vertices["blue"] = colors.T
+
+    faces = np.empty(len(triangles), dtype=[("count", "u1"), ("indices", "<i4", 3)])
+    faces["count"] = 3
+    faces["indices"] = triangles
+
+    header = ["ply", "format binary_little_endian 1.0", "element vertex %d" % len(vertices)]
+    for name, dtype in vertex_fields:
+        header.append("property %s %s" % ("uchar" if dtype == "u1" else "float", name))
+    header += ["element face %d" % len(faces), "property list uchar int vertex_indices", "end_header"]
+
+    # Write to a temporary file first, so other renders never read a half-written file
+    temp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+    with open(temp_filepath, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        vertices.tofile(f)
+        faces.tofile(f)
+    os.replace(temp_filepath, filepath)
@@ -1,44 +1,199 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from .. import utils
+from . import mesh_cache
 from .caches.exported_data import ExportedMesh
 
 
-def convert(obj, mesh_key, depsgraph, luxcore_scene, is_viewport_render, use_instancing, transform):
+def convert(obj, mesh_key, depsgraph, luxcore_scene, is_viewport_render, use_instancing, transform,
+            mesh_cache_dir=None):
+    """ If mesh_cache_dir is set, the mesh is read from/written to the on-disk mesh cache """
+    if mesh_cache_dir:
+        mesh_transform = None if use_instancing else utils.matrix_to_list(transform)
+        # Unmodified meshes that were cached before don't have to be evaluated
+        exported_mesh = mesh_cache.convert_static(obj, mesh_key, luxcore_scene, mesh_transform, mesh_cache_dir)
+        if exported_mesh is not None:
+            return exported_mesh
+
     with _prepare_mesh(obj, depsgraph) as mesh:
         if mesh is None:
             return None
 
-        loopTriPtr = mesh.loop_triangles[0].as_pointer()
-        loopTriCount = len(mesh.loop_triangles)
-        loopPtr = mesh.loops[0].as_pointer()
-        vertPtr = mesh.vertices[0].as_pointer()
-        polyPtr = mesh.polygons[0].as_pointer()
+        if mesh_cache_dir:
+            return mesh_cache.convert(obj, mesh, mesh_key, luxcore_scene, mesh_transform, mesh_cache_dir,
+                                      _estimate_size(mesh))
+
+        mesh_transform = _get_mesh_transform(is_viewport_render, use_instancing, transform)
+        mesh_definitions = luxcore_scene.DefineBlenderMesh(*_get_define_args(mesh, mesh_key, mesh_transform))
+        exported_mesh = ExportedMesh(mesh_definitions)
+        exported_mesh.triangle_count, exported_mesh.memory = _estimate_size(mesh)
+        return exported_mesh
 
-        if mesh.uv_layers:
-            # TODO get actual active layer
-            active_uv_layer = 0
-            loopUVsPtr = mesh.uv_layers[active_uv_layer].data[0].as_pointer()
-        else:
-            loopUVsPtr = 0
 
-        if mesh.vertex_colors:
-            # TODO get actual active layer
-            active_vcol_layer = 0
-            loopColsPtr = mesh.vertex_colors[active_vcol_layer].data[0].as_pointer()
-        else:
-            loopColsPtr = 0
+class ConversionPipeline:
+    """
+    Overlaps the mesh evaluation in Blender, which has to happen on the main thread,
+    with the mesh definition in LuxCore, which runs on a worker thread (the GIL is
+    released by LuxCore during DefineBlenderMesh).
+
+    Only one worker is used instead of a pool: the LuxCore scene must not be edited
+    concurrently, so the parallelism comes from overlapping Blender and LuxCore work.
+    For the same reason, drain() has to be called before the main thread makes any
+    other call on the LuxCore scene while meshes are in flight (e.g. hair or area lights).
+    Callbacks can run while the worker defines the next mesh, so they must not use the scene.
+
+    The temporary Blender meshes have to stay alive until LuxCore has read them,
+    so at most max_in_flight meshes are evaluated but not yet defined in LuxCore.
+    Callbacks are called on the main thread, in the order the meshes were submitted.
+    """
+    def __init__(self, luxcore_scene, max_in_flight=4):
+        self.luxcore_scene = luxcore_scene
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        # (mesh_key, future, object_eval, size)
+        self._pending = deque()
+        # {mesh_key: [callback, ...]}
+        self._callbacks = {}
+        # Pointers of the evaluated objects whose temporary mesh is in self._pending
+        self._objects_in_flight = set()
+
+    def submit(self, obj, mesh_key, depsgraph, is_viewport_render, use_instancing, transform, callback):
+        """ callback is called with the ExportedMesh (or None) when the mesh is defined in LuxCore """
+        if mesh_key in self._callbacks:
+            # The same mesh is already being converted
+            self._callbacks[mesh_key].append(callback)
+            return
 
-        material_count = max(1, len(mesh.materials))
+        object_eval = obj.evaluated_get(depsgraph)
+        if object_eval:
+            # The same object can be submitted under different keys (e.g. directly visible and
+            # instanced by a collection). to_mesh() frees its previous temporary mesh, so LuxCore
+            # has to be done with that mesh first
+            object_pointer = object_eval.as_pointer()
+            while object_pointer in self._objects_in_flight:
+                self._finish_oldest()
+
+        mesh = _create_mesh(object_eval) if object_eval else None
+        if mesh is None:
+            callback(None)
+            return
+
+        mesh_transform = _get_mesh_transform(is_viewport_render, use_instancing, transform)
+        future = self._executor.submit(self.luxcore_scene.DefineBlenderMesh,
+                                       *_get_define_args(mesh, mesh_key, mesh_transform))
+        self._pending.append((mesh_key, future, object_eval, _estimate_size(mesh)))
+        self._callbacks[mesh_key] = [callback]
+        self._objects_in_flight.add(object_pointer)
+
+        while len(self._pending) > self.max_in_flight:
+            self._finish_oldest()
+
+    def drain(self):
+        """ Wait until the worker is done with the LuxCore scene and call the pending callbacks """
+        while self._pending:
+            self._finish_oldest()
+
+    def finish(self):
+        """ Wait for all pending meshes and call their callbacks """
+        try:
+            self.drain()
+        finally:
+            self.abort()
+
+    def abort(self):
+        """ Wait for all pending meshes, but don't call their callbacks """
+        while self._pending:
+            mesh_key, future, object_eval, size = self._pending.popleft()
+            # Wait until LuxCore is done with the mesh before it is freed
+            future.exception()
+            object_eval.to_mesh_clear()
+        self._objects_in_flight.clear()
+        self._callbacks.clear()
+        self._executor.shutdown()
+
+    def _finish_oldest(self):
+        mesh_key, future, object_eval, size = self._pending.popleft()
+        try:
+            mesh_definitions = future.result()
+        finally:
+            object_eval.to_mesh_clear()
+            self._objects_in_flight.discard(object_eval.as_pointer())
+
+        exported_mesh = ExportedMesh(mesh_definitions)
+        exported_mesh.triangle_count, exported_mesh.memory = size
+        for callback in self._callbacks.pop(mesh_key):
+            callback(exported_mesh)
+
+
+def _estimate_size(mesh):
+    """ Returns the triangle count and the estimated memory in bytes of the shapes LuxCore creates from the mesh """
+    triangle_count = len(mesh.loop_triangles)
+    # Position and normal. Vertices are split at UV and normal seams, so the loop count is an upper bound
+    bytes_per_vertex = 24
+    if mesh.uv_layers:
+        bytes_per_vertex += 8
+    if mesh.vertex_colors:
+        bytes_per_vertex += 12
+    return triangle_count, triangle_count * 12 + len(mesh.loops) * bytes_per_vertex
+
+
+def _get_mesh_transform(is_viewport_render, use_instancing, transform):
+    if is_viewport_render or use_instancing:
+        return None
+    else:
+        return utils.matrix_to_list(transform)
+
+
+def _get_define_args(mesh, mesh_key, mesh_transform):
+    """ Returns the arguments for luxcore_scene.DefineBlenderMesh() """
+    loopTriPtr = mesh.loop_triangles[0].as_pointer()
+    loopTriCount = len(mesh.loop_triangles)
+    loopPtr = mesh.loops[0].as_pointer()
+    vertPtr = mesh.vertices[0].as_pointer()
+    polyPtr = mesh.polygons[0].as_pointer()
+
+    if mesh.uv_layers:
+        # TODO get actual active layer
+        active_uv_layer = 0
+        loopUVsPtr = mesh.uv_layers[active_uv_layer].data[0].as_pointer()
+    else:
+        loopUVsPtr = 0
+
+    if mesh.vertex_colors:
+        # TODO get actual active layer
+        active_vcol_layer = 0
+        loopColsPtr = mesh.vertex_colors[active_vcol_layer].data[0].as_pointer()
+    else:
+        loopColsPtr = 0
+
+    material_count = max(1, len(mesh.materials))
+
+    return (mesh_key, loopTriCount, loopTriPtr, loopPtr, vertPtr, polyPtr,
+            loopUVsPtr, loopColsPtr, material_count, mesh_transform)
+
+
+def _create_mesh(object_eval):
+    """
+    Create the temporary mesh of an evaluated object, prepared for DefineBlenderMesh.
+    Returns None if the object has no mesh with faces (the temporary mesh is cleared in this case).
+    The caller has to call object_eval.to_mesh_clear() if a mesh is returned.
+    """
+    mesh = object_eval.to_mesh()
+
+    if mesh:
+        mesh.calc_loop_triangles()
+        if not mesh.loop_triangles:
+            object_eval.to_mesh_clear()
+            mesh = None
 
-        if is_viewport_render or use_instancing:
-            mesh_transform = None
-        else:
-            mesh_transform = utils.matrix_to_list(transform)
+    if mesh:
+        if mesh.use_auto_smooth and not mesh.has_custom_normals:
+            mesh.calc_normals()
+            mesh.split_faces()
+        mesh.calc_loop_triangles()
 
-        mesh_definitions = luxcore_scene.DefineBlenderMesh(mesh_key, loopTriCount, loopTriPtr, loopPtr,
-                                                           vertPtr, polyPtr, loopUVsPtr, loopColsPtr,
-                                                           material_count, mesh_transform)
-        return ExportedMesh(mesh_definitions)
+    return mesh
 
 
 @contextmanager
@@ -62,19 +217,7 @@ def _prepare_mesh(obj, depsgraph):
     try:
         object_eval = obj.evaluated_get(depsgraph)
         if object_eval:
-            mesh = object_eval.to_mesh()
-
-            if mesh:
-                mesh.calc_loop_triangles()
-                if not mesh.loop_triangles:
-                    object_eval.to_mesh_clear()
-                    mesh = None
-
-            if mesh:
-                if mesh.use_auto_smooth and not mesh.has_custom_normals:
-                    mesh.calc_normals()
-                    mesh.split_faces()
-                mesh.calc_loop_triangles()
+            mesh = _create_mesh(object_eval)
 
         yield mesh
     finally:
@@ -1,8 +1,13 @@
 import math
-from ..bin import pyluxcore
+import numpy as np
+from itertools import chain
+from array import array
 from .. import utils
 from .caches.exported_data import ExportedObject
 
+CAMERA_KEY = "camera"
+CAMERA_PREFIX = "scene.camera."
+
 
 # TODO fix motion blur of area lights, they get a wrong transformation
 
@@ -15,90 +20,240 @@ def convert(context, engine, scene, depsgraph, object_cache2):
     assert steps >= 2 and isinstance(steps, int)
 
     frame_offsets = _calc_frame_offsets(motion_blur.shutter, steps)
-    matrices = _get_matrices(context, engine, scene, steps, frame_offsets, depsgraph, object_cache2)
-
-    # Find and delete entries of non-moving objects (where all matrices are equal)
-    for prefix, matrix_steps in list(matrices.items()):
-        matrices_equal = utils.all_elems_equal(matrix_steps)
+    sampler = MotionSampler(steps)
+    _sample_matrices(context, engine, scene, sampler, frame_offsets, depsgraph, object_cache2)
 
-        if matrices_equal:
-            # This object does not need motion blur because it does not move
-            del matrices[prefix]
+    # Only moving objects are returned, all others do not need motion blur
+    prefixes, transformations = sampler.get_moving()
 
     # Export the properties for moving objects
-    props = pyluxcore.Properties()
+    builder = utils.PropertyBuilder()
 
-    for prefix, matrix_steps in matrices.items():
+    for prefix, matrix_steps in zip(prefixes, transformations):
         for step in range(steps):
             time = frame_offsets[step]
-            matrix = matrix_steps[step]
-            transformation = utils.matrix_to_list(matrix, scene, apply_worldscale=True)
-            definitions = {
-                "motion.%d.time" % step: time,
-                "motion.%d.transformation" % step: transformation,
-            }
-            props.Set(utils.create_props(prefix, definitions))
+            builder.add(prefix + "motion.%d.time" % step, time)
+            builder.add(prefix + "motion.%d.transformation" % step, matrix_steps[step].tolist())
+
+    props = builder.get_props()
 
     # We need this information outside
-    is_camera_moving = "scene.camera." in matrices
+    is_camera_moving = CAMERA_PREFIX in prefixes
     return props, is_camera_moving
 
 
+class MotionSampler:
+    """
+    Collects the world matrices of objects at each motion blur step in a
+    preallocated (objects, steps, 16) array.
+    Objects are registered in the first step. In later steps, only objects that
+    may move are sampled again, all others keep the matrix of the previous step.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.step = 0
+        # {key: index into the matrix array}
+        self._indices = {}
+        # [(luxcore_prefix, index), ...], objects split by material have one entry per part
+        self._prefixes = []
+        # Keys of the objects that have to be sampled in every step
+        self.dynamic_keys = set()
+        # {key: original object} of the dynamic objects that are not instances,
+        # they can be sampled without walking all object instances
+        self.dynamic_objects = {}
+        # Pointers of the instancers that have at least one dynamic instance
+        self.dynamic_instancers = set()
+        # Row-major matrices and their indices, collected during the current step
+        self._step_matrices = array("f")
+        self._step_indices = []
+        self._matrices = None
+
+    def begin_step(self, step):
+        self.step = step
+        self._step_matrices = array("f")
+        self._step_indices = []
+
+        if step > 0:
+            # Carry over the matrices of static objects
+            self._matrices[:, step] = self._matrices[:, step - 1]
+
+    def end_step(self):
+        values = np.frombuffer(self._step_matrices, dtype=np.float32).reshape(-1, 16)
+
+        if self.step == 0:
+            self._matrices = np.empty((len(self._indices), self.steps, 16), dtype=np.float32)
+            # Fill all steps, later steps might not be sampled at all if nothing can move
+            self._matrices[:] = values[:, np.newaxis]
+        elif self._step_indices:
+            self._matrices[self._step_indices, self.step] = values
+
+    def add(self, key, prefixes, matrix, may_move):
+        """ Register an object, only allowed in the first step """
+        assert self.step == 0
+        if key in self._indices:
+            return
+        index = len(self._indices)
+        self._indices[key] = index
+        self._prefixes.extend((prefix, index) for prefix in prefixes)
+        self._step_matrices.extend(chain.from_iterable(matrix))
+        if may_move:
+            self.dynamic_keys.add(key)
+
+    def update(self, key, matrix):
+        """ Sample an object again in a later step """
+        # Objects that only appeared after the first step are ignored
+        index = self._indices.get(key)
+        if index is not None:
+            self._step_indices.append(index)
+            self._step_matrices.extend(chain.from_iterable(matrix))
+
+    def get_moving(self):
+        """
+        Returns the LuxCore prefixes of all moving objects and an array with
+        their transformations in LuxCore order, shape (len(prefixes), steps, 16)
+        """
+        if not self._prefixes:
+            return [], np.empty((0, self.steps, 16))
+
+        matrices = self._matrices
+        is_moving = np.any(matrices != matrices[:, :1], axis=(1, 2))
+
+        prefixes = []
+        indices = []
+        for prefix, index in self._prefixes:
+            if is_moving[index]:
+                prefixes.append(prefix)
+                indices.append(index)
+
+        transformations = utils.matrices_to_array(matrices[indices])
+        return prefixes, transformations.reshape(-1, self.steps, 16)
+
+
 def _calc_frame_offsets(shutter, steps):
-    """ Return a list of offsets (unit: frame) to step through in _get_matrices() """
+    """ Return a list of offsets (unit: frame) to step through in _sample_matrices() """
     step_interval = shutter / (steps - 1)
     return [step_interval * step - shutter / 2 for step in range(steps)]
 
 
-def _get_matrices(context, engine, scene, steps, frame_offsets, depsgraph=None, object_cache2=None):
+def _sample_matrices(context, engine, scene, sampler, frame_offsets, depsgraph=None, object_cache2=None):
     motion_blur = scene.camera.data.luxcore.motion_blur
-    matrices = {}  # {prefix: [matrix1, matrix2, ...]}
+    use_object_blur = motion_blur.object_blur and depsgraph and object_cache2
+    use_camera_blur = motion_blur.camera_blur and not context
 
     frame_center = scene.frame_current
     subframe_center = scene.frame_subframe
-    for step in range(steps):
+    for step in range(sampler.steps):
+        if step > 0 and not use_camera_blur and not sampler.dynamic_keys:
+            # Nothing can move, the remaining steps would all be equal to the first one
+            break
+
         offset = frame_offsets[step]
         frame = frame_center + subframe_center + offset
         frame_int = math.floor(frame)
         subframe = frame - frame_int
         engine.frame_set(frame_int, subframe)
-        if motion_blur.object_blur and depsgraph and object_cache2:
-            _append_object_matrices(depsgraph, object_cache2, matrices, step)
+        sampler.begin_step(step)
 
-        if motion_blur.camera_blur and not context:
+        if use_object_blur:
+            if step == 0:
+                _add_object_matrices(depsgraph, object_cache2, sampler)
+            elif sampler.dynamic_keys:
+                _update_object_matrices(depsgraph, object_cache2, sampler)
+
+        if use_camera_blur:
             matrix = scene.camera.matrix_world
+            if step == 0:
+                sampler.add(CAMERA_KEY, [CAMERA_PREFIX], matrix, may_move=True)
+            else:
+                sampler.update(CAMERA_KEY, matrix)
 
-            prefix = "scene.camera."
-            _append_matrix(matrices, prefix, matrix, step)
+        sampler.end_step()
 
     # Restore original frame
     engine.frame_set(frame_center, subframe_center)
-    return matrices
 
 
-def _append_object_matrices(depsgraph, object_cache2, matrices, step):
-    for index, dg_obj_instance in enumerate(depsgraph.object_instances, start=1):
+def _add_object_matrices(depsgraph, object_cache2, sampler):
+    # {pointer: bool}, shared by all objects to analyze each parent chain only once
+    animated_cache = {}
+
+    for dg_obj_instance in depsgraph.object_instances:
         obj = dg_obj_instance.instance_object if dg_obj_instance.is_instance else dg_obj_instance.object
-        obj_key = utils.make_key_from_instance(dg_obj_instance)
-
-        try:
-            if obj_key in object_cache2.exported_objects:
-                if isinstance(object_cache2.exported_objects[obj_key], ExportedObject) and obj.luxcore.enable_motion_blur:
-                    for p in object_cache2.exported_objects[obj_key].parts:
-                        luxcore_name = p.lux_obj
-                        prefix = "scene.objects." + luxcore_name + "."
-                        matrix = obj.matrix_world
-                        _append_matrix(matrices, prefix, matrix, step)
-
-        except KeyError:
-            # This is not a problem, objects are skipped during export for various reasons
-            # E.g. if the object is not visible, or if it's a camera
-            pass
-
-
-def _append_matrix(matrices, prefix, matrix, step):
-    matrix = matrix.copy()
-    if step == 0:
-        matrices[prefix] = [matrix]
-    else:
-        matrices[prefix].append(matrix)
+        obj_key = object_cache2.instance_keys.get_key(dg_obj_instance)
+
+        # Objects are skipped during export for various reasons,
+        # e.g. if they are not visible, or if they are cameras
+        exported_obj = object_cache2.exported_objects.get(obj_key)
+        if not isinstance(exported_obj, ExportedObject) or not obj.luxcore.enable_motion_blur:
+            continue
+
+        prefixes = ["scene.objects." + part.lux_obj + "." for part in exported_obj.parts]
+        may_move = _may_move(dg_obj_instance, animated_cache)
+        sampler.add(obj_key, prefixes, dg_obj_instance.matrix_world, may_move)
+
+        if may_move:
+            if dg_obj_instance.is_instance:
+                sampler.dynamic_instancers.add(dg_obj_instance.parent.original.as_pointer())
+            else:
+                sampler.dynamic_objects[obj_key] = dg_obj_instance.object.original
+
+
+def _update_object_matrices(depsgraph, object_cache2, sampler):
+    for obj_key, obj in sampler.dynamic_objects.items():
+        sampler.update(obj_key, obj.evaluated_get(depsgraph).matrix_world)
+
+    remaining = len(sampler.dynamic_keys) - len(sampler.dynamic_objects)
+    if remaining == 0:
+        return
+
+    # Only instances of instancers with dynamic instances need a key, stop when all are sampled
+    dynamic_keys = sampler.dynamic_keys
+    dynamic_instancers = sampler.dynamic_instancers
+
+    for dg_obj_instance in depsgraph.object_instances:
+        if not dg_obj_instance.is_instance or dg_obj_instance.parent.original.as_pointer() not in dynamic_instancers:
+            continue
+
+        obj_key = object_cache2.instance_keys.get_key(dg_obj_instance)
+        if obj_key in dynamic_keys:
+            sampler.update(obj_key, dg_obj_instance.matrix_world)
+            remaining -= 1
+            if remaining == 0:
+                break
+
+
+def _may_move(dg_obj_instance, animated_cache):
+    """
+    Conservative check if the world matrix of an instance can change between frames.
+    If this returns False, the instance does not have to be sampled in later steps.
+    """
+    if not dg_obj_instance.is_instance:
+        return _is_animated(dg_obj_instance.object.original, animated_cache)
+
+    instancer = dg_obj_instance.parent.original
+    if instancer.instance_type != "COLLECTION":
+        # Particles, or vertex/face instancing on a mesh that might be deformed
+        return True
+    return (_is_animated(instancer, animated_cache)
+            or _is_animated(dg_obj_instance.instance_object.original, animated_cache))
+
+
+def _is_animated(obj, animated_cache):
+    """ Check if the world matrix of an object depends on the frame, including its parent chain """
+    pointer = obj.as_pointer()
+    try:
+        return animated_cache[pointer]
+    except KeyError:
+        pass
+
+    # Note: animation_data also contains drivers
+    animated = bool(obj.animation_data or obj.constraints or obj.rigid_body
+                    # Vertex parents follow the deformation of the parent mesh, bone parents the pose,
+                    # which can be changed by actions, drivers and constraints on any bone of the armature
+                    or obj.parent_type in {"VERTEX", "VERTEX_3", "BONE"}
+                    or (obj.parent and (_is_animated(obj.parent, animated_cache)
+                                        # E.g. the path animation of a curve moves the children (follow path)
+                                        or getattr(obj.parent.data, "animation_data", None))))
+    animated_cache[pointer] = animated
+    return animated
@@ -0,0 +1,114 @@
+import json
+import os
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+# Returned by measure() when the profiler is disabled, re-usable because it has no state
+_NULL_CONTEXT = nullcontext()
+
+
+class Timing:
+    __slots__ = ("time", "count", "bytes")
+
+    def __init__(self):
+        self.time = 0
+        self.count = 0
+        # Size of the data handed to LuxCore (only known for some datablock types)
+        self.bytes = 0
+
+    def to_dict(self):
+        return {"time": self.time, "count": self.count, "bytes": self.bytes}
+
+
+class ExportProfiler:
+    """
+    Collects the time spent in the stages of an export and in the conversion of
+    single datablocks (objects, materials, hair systems ...).
+    Datablock timings are inclusive, e.g. the time of an object contains the
+    time of its materials and hair systems.
+    Stages are always timed. Datablocks are only timed if the profiler is enabled,
+    otherwise measure() and add_bytes() do nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # {stage_name: Timing}, in the order the stages were entered
+        self.stages = {}
+        # {category: {datablock_name: Timing}}
+        self.datablocks = {}
+
+    def reset(self):
+        self.stages.clear()
+        self.datablocks.clear()
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._add_time(self.stages, name, perf_counter() - start)
+
+    def measure(self, category, name):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._measure(category, name)
+
+    @contextmanager
+    def _measure(self, category, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._add_time(self.datablocks.setdefault(category, {}), name, perf_counter() - start)
+
+    def add_bytes(self, category, name, byte_count):
+        if not self.enabled:
+            return
+        timings = self.datablocks.setdefault(category, {})
+        try:
+            timings[name].bytes += byte_count
+        except KeyError:
+            timing = timings[name] = Timing()
+            timing.bytes = byte_count
+
+    def get_stage_time(self, name):
+        try:
+            return self.stages[name].time
+        except KeyError:
+            return 0
+
+    def get_category_time(self, category):
+        return sum(timing.time for timing in self.datablocks.get(category, {}).values())
+
+    def to_dict(self):
+        categories = {}
+        for category, timings in self.datablocks.items():
+            categories[category] = {
+                "time": sum(timing.time for timing in timings.values()),
+                "count": sum(timing.count for timing in timings.values()),
+                "bytes": sum(timing.bytes for timing in timings.values()),
+                # Slowest datablocks first
+                "datablocks": {name: timing.to_dict() for name, timing
+                               in sorted(timings.items(), key=lambda item: item[1].time, reverse=True)},
+            }
+
+        return {
+            "stages": {name: timing.to_dict() for name, timing in self.stages.items()},
+            "categories": categories,
+        }
+
+    def write_report(self, filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print("Export profile written to", filepath)
+
+    @staticmethod
+    def _add_time(timings, name, elapsed):
+        try:
+            timing = timings[name]
+        except KeyError:
+            timing = timings[name] = Timing()
+        timing.time += elapsed
+        timing.count += 1
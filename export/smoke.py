@@ -1,6 +1,10 @@
+import bpy
 from time import time
 from .. import utils
-import array
+import numpy as np
+
+# Amount of grid cells that are copied from Blender and appended to LuxCore at once
+SLAB_CELLS = 2**16
 
 
 def convert(smoke_obj, channel, depsgraph):
@@ -32,10 +36,6 @@ def convert(smoke_obj, channel, depsgraph):
         msg = 'Object "%s": No smoke data (simulate some frames first)' % smoke_obj.name
         raise Exception(msg)
 
-    # We have to convert Blender's bpy_prop_array because it doesn't support the Python buffer interface.
-    # We use an array instead of a list here to save a lot of memory (list would use doubles instead of floats).
-    channeldata = array.array("f", grid)
-
     # The smoke resolution along the x, y, z axis
     resolution = list(settings.domain_resolution)
 
@@ -44,6 +44,110 @@ def convert(smoke_obj, channel, depsgraph):
         for i in range(3):
             resolution[i] *= settings.amplify + 1
 
-    print("conversion to array took %.3f s" % (time() - start))
+    print("grid lookup took %.3f s" % (time() - start))
+
+    # The grid is not copied here, use GridCache.get() to extract it
+    return resolution, grid
+
+
+class GridCache:
+    """
+    Holds the grids extracted from smoke domains during one session, so all smoke
+    textures that read the same channel of a domain share one copy of the grid.
+    All grids are dropped when the frame changes. Final renders clear the cache
+    once the scene is exported, so the grids are not kept next to LuxCore's copy.
+    Viewport renders would keep them for the whole session, so with keep_grids = False
+    the Blender grid is returned and streamed to LuxCore without a full copy.
+    """
+
+    def __init__(self):
+        # {(domain_key, channel, frame, resolution): grid}
+        self._grids = {}
+        self._frame = None
+        # How often a grid was re-used instead of extracted again (in the current frame)
+        self.hits = 0
+        self.keep_grids = True
+
+    def get(self, domain, channel, depsgraph):
+        """
+        Returns the resolution and the grid, either as flat float32 array or,
+        if keep_grids is False, as Blender array. Both can be passed to add_grid_to_property().
+        """
+        frame = depsgraph.scene_eval.frame_current
+        if frame != self._frame:
+            self.clear()
+            self._frame = frame
+
+        # Cheap, the grid is not copied here
+        resolution, blender_grid = convert(domain, channel, depsgraph)
+        if not self.keep_grids:
+            return resolution, blender_grid
+
+        key = (utils.make_key(domain), channel, frame, tuple(resolution))
+
+        try:
+            grid = self._grids[key]
+            self.hits += 1
+            print("Re-using %s grid of smoke domain %s" % (channel, domain.name))
+        except KeyError:
+            grid = _extract_grid(blender_grid)
+            self._grids[key] = grid
+        return resolution, grid
+
+    def update(self, depsgraph):
+        """ Drop the grids of domains that were changed (e.g. re-simulated) during viewport render """
+        updated_keys = {utils.make_key(dg_update.id) for dg_update in depsgraph.updates
+                        if isinstance(dg_update.id, bpy.types.Object)}
+        for key in list(self._grids.keys()):
+            if key[0] in updated_keys:
+                del self._grids[key]
+
+    def clear(self):
+        self._grids.clear()
+        self.hits = 0
+
+
+def _extract_grid(blender_grid):
+    """
+    Copy a Blender grid (bpy_prop_array) into a float32 array, one slab at a time.
+    Blender's array doesn't support the Python buffer interface, slicing it avoids
+    creating a Python float object for every value of the whole grid at once.
+    """
+    grid = np.empty(len(blender_grid), dtype=np.float32)
+    slab_size = SLAB_CELLS * 4
+
+    for start in range(0, len(grid), slab_size):
+        end = start + slab_size
+        grid[start:end] = blender_grid[start:end]
+    return grid
+
+
+def add_grid_to_property(prop, grid, values_per_cell=1, values_to_copy=None):
+    """
+    Append the values of a grid returned by GridCache.get() to the property, one slab at a time.
+    Slabs of an extracted float32 grid are views, slabs of a Blender grid (which doesn't support
+    the Python buffer interface) are copied into a reusable float32 buffer first. In both cases
+    LuxCore reads the slab without further copies, so no temporary copy of the whole grid is made.
+    If values_to_copy is smaller than values_per_cell, the remaining values of each cell
+    are skipped (e.g. to convert the RGBA color grid to RGB).
+    """
+    if values_to_copy is None:
+        values_to_copy = values_per_cell
+
+    # The slab size is a multiple of values_per_cell, so a cell is never split between slabs
+    slab_size = SLAB_CELLS * values_per_cell
+    is_extracted = isinstance(grid, np.ndarray)
+    buffer = None if is_extracted else np.empty(slab_size, dtype=np.float32)
+
+    for start in range(0, len(grid), slab_size):
+        if is_extracted:
+            slab = grid[start:start + slab_size]
+        else:
+            values = grid[start:start + slab_size]
+            slab = buffer[:len(values)]
+            slab[:] = values
 
-    return resolution, channeldata
+        if values_to_copy < values_per_cell:
+            prop.AddAllFloat(slab, values_to_copy, values_per_cell - values_to_copy)
+        else:
+            prop.AddAllFloat(slab)
@@ -2,7 +2,7 @@ import bpy
 from bpy.types import SpaceView3D, SpaceImageEditor
 from . import (
     draw_imageeditor, exit,
-    load_post, depsgraph_update_post,
+    load_post, depsgraph_update_post, undo_post,
 )
 
 
@@ -14,6 +14,8 @@ def register():
 
     bpy.app.handlers.load_post.append(load_post.handler)
     bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_post.handler)
+    bpy.app.handlers.undo_post.append(undo_post.handler)
+    bpy.app.handlers.redo_post.append(undo_post.handler)
 
     args = ()
     draw_imageeditor.handle = SpaceImageEditor.draw_handler_add(draw_imageeditor.handler,
@@ -23,4 +25,6 @@ def register():
 def unregister():
     bpy.app.handlers.load_post.remove(load_post.handler)
     bpy.app.handlers.depsgraph_update_post.remove(depsgraph_update_post.handler)
+    bpy.app.handlers.undo_post.remove(undo_post.handler)
+    bpy.app.handlers.redo_post.remove(undo_post.handler)
     SpaceImageEditor.draw_handler_remove(draw_imageeditor.handle, 'WINDOW')
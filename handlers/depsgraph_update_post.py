@@ -1,8 +1,19 @@
 import bpy
 from bpy.app.handlers import persistent
+from .. import utils
+from ..export import mesh_cache
 
 @persistent
-def handler(scene):
+def handler(scene, depsgraph=None):
+    # Lets the exporter caches detect that properties might have changed
+    utils.count_depsgraph_update()
+    # Blender versions before 2.81 don't pass the depsgraph. Evaluating it here could
+    # trigger the update handlers again, so the changed meshes are unknown in this case
+    if depsgraph is None:
+        mesh_cache.reset()
+    else:
+        mesh_cache.tag_updates(depsgraph)
+
     # If material name was changed, rename the node tree, too.
     for mat in bpy.data.materials:
         node_tree = mat.luxcore.node_tree
@@ -5,6 +5,7 @@ from bpy.app.handlers import persistent
 from ..bin import pyluxcore
 from .. import utils
 from ..utils import compatibility
+from ..export import mesh_cache
 
 
 @persistent
@@ -48,4 +49,7 @@ def handler(_):
             scene.luxcore.config.photongi.file_path = pgi_path
 
     # Run converters for backwards compatibility
+    # (the datablocks of the previous file are no longer valid)
+    compatibility.reset()
     compatibility.run()
+    mesh_cache.reset()
@@ -0,0 +1,8 @@
+from bpy.app.handlers import persistent
+from ..export import mesh_cache
+
+
+@persistent
+def handler(scene, depsgraph=None):
+    """ Also registered for redo. Undo reloads the datablocks, so their update counts are meaningless """
+    mesh_cache.reset()
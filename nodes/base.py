@@ -22,6 +22,9 @@ class LuxCoreNodeTree:
             self.links.new(from_socket, to_socket)
         self.requested_links.clear()
 
+        # Nodes might have been added or removed
+        utils_node.tree_index.invalidate(self)
+
         # We have to force an update through a Blender property, otherwise the
         # material preview, the viewport render etc. do not update
         self.refresh = True
@@ -265,6 +268,8 @@ class LuxCoreNodeTreePointer(bpy.types.Node, LuxCoreNode):
     suffix = "pointer"
 
     def update_node_tree(self, context):
+        utils_node.tree_index.invalidate(self.id_data)
+
         if self.node_tree:
             self.outputs["Material"].enabled = self.node_tree.bl_idname == "luxcore_material_nodes"
             self.outputs["Color"].enabled = self.node_tree.bl_idname == "luxcore_texture_nodes"
@@ -112,7 +112,9 @@ class LuxCoreNodeTexSmoke(bpy.types.Node, LuxCoreNodeTexture):
                                                      apply_worldscale=True,
                                                      invert=True)
 
-        resolution, grid = smoke.convert(domain, self.source, depsgraph)
+        with exporter.profiler.measure("SMOKE", self.domain.name):
+            resolution, grid = exporter.smoke_grid_cache.get(domain, self.source, depsgraph)
+        exporter.profiler.add_bytes("SMOKE", self.domain.name, len(grid) * 4)
         nx, ny, nz = resolution
 
         definitions = {
@@ -129,25 +131,19 @@ class LuxCoreNodeTexSmoke(bpy.types.Node, LuxCoreNodeTexture):
 
         luxcore_name = self.create_props(props, definitions, luxcore_name)
         prefix = self.prefix + luxcore_name + "."
-        # We use a fast path (AddAllFloat method) here to transfer the grid data to the properties
+        # The grid is appended in slabs (AddAllFloat method) to the property, to avoid copies of the whole grid
 
         if self.source == "color":
             prop = pyluxcore.Property(prefix + "data3", [])
             # Omit every 4th element because the color_grid contains 4 values per cell
             # but LuxCore expects 3 values per cell (r, g, b)
-            prop.AddAllFloat(grid, 3, 1)
+            smoke.add_grid_to_property(prop, grid, 4, 3)
         elif self.source == "velocity":
             prop = pyluxcore.Property(prefix + "data3", [])
-            prop.AddAllFloat(grid)
+            smoke.add_grid_to_property(prop, grid, 3)
         else:
             prop = pyluxcore.Property(prefix + "data", [])
-            prop.AddAllFloat(grid)
-
-        # We have to free the memory manually because the grid can be VERY large
-        # and if we don't invoke the garbage collection, we use way more RAM than necessary
-        del grid
-        import gc
-        gc.collect()
+            smoke.add_grid_to_property(prop, grid)
 
         props.Set(prop)
 
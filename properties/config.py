@@ -48,6 +48,11 @@ SEED_DESC = (
 )
 ANIM_SEED_DESC = "Use different seed values for different frames"
 
+MESH_CACHE_DESC = (
+    "Save exported meshes as PLY files, named by a hash of their geometry, and re-use them "
+    "in later frames and re-renders if the geometry did not change (final render only)"
+)
+
 SOBOL_ADAPTIVE_STRENGTH_DESC = (
     "A value of 0 means that each pixel is sampled equally, higher values "
     "focus more samples on noisy areas of the image"
@@ -423,6 +428,11 @@ class LuxCoreConfig(PropertyGroup):
     filesaver_format: EnumProperty(name="", items=filesaver_format_items, default="TXT")
     filesaver_path: StringProperty(name="", subtype="DIR_PATH")
 
+    # Mesh cache options
+    use_mesh_cache: BoolProperty(name="Cache Meshes on Disk", default=False, description=MESH_CACHE_DESC)
+    mesh_cache_path: StringProperty(name="Cache Directory", subtype="DIR_PATH",
+                                    description="Directory where the cached meshes are stored")
+
     # Seed
     seed: IntProperty(name="Seed", default=1, min=1, description=SEED_DESC)
     use_animated_seed: BoolProperty(name="Animated Seed", default=False, description=ANIM_SEED_DESC)
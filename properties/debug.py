@@ -10,3 +10,8 @@ class LuxCoreDebugSettings(bpy.types.PropertyGroup):
                                               "If the problem shows up in this mode, it is most "
                                               "likely a bug in LuxCore and not an OpenCL compiler bug")
     print_properties: BoolProperty(name="Print Properties", default=False)
+    write_export_profile: BoolProperty(name="Write Export Profile", default=False,
+                                       description="Write a JSON file with the time spent in each export stage, "
+                                                   "object, material and hair system next to the rendered image "
+                                                   "(final render only). Also needed for the material and hair "
+                                                   "times in the statistics")
@@ -115,6 +115,10 @@ def vram_usage_to_string(usage_tuple):
     return "%d MiB/%d MiB" % (used_memory, max_memory)
 
 
+def mesh_memory_to_string(memory):
+    return "%.1f MiB" % (memory / (1024 * 1024))
+
+
 def vram_better(first_usage_tuple, second_usage_tuple):
     first_used_memory, _ = first_usage_tuple
     second_used_memory, _ = second_usage_tuple
@@ -186,9 +190,22 @@ class LuxCoreRenderStats:
                                 0, smaller_is_better, time_to_string, get_rounded)
         self.session_init_time = Stat("Session Init Time", categories[-1],
                                       0, smaller_is_better, time_to_string, get_rounded)
+        categories.append("Export")
+        # Times of materials and hair are included in the objects time
+        self.objects_export_time = Stat("Objects", categories[-1],
+                                        0, smaller_is_better, time_to_string, get_rounded)
+        self.materials_export_time = Stat("Materials", categories[-1],
+                                          0, smaller_is_better, time_to_string, get_rounded)
+        self.hair_export_time = Stat("Hair", categories[-1],
+                                     0, smaller_is_better, time_to_string, get_rounded)
+        self.config_export_time = Stat("Config", categories[-1],
+                                       0, smaller_is_better, time_to_string, get_rounded)
         categories.append("Scene")
         self.light_count = Stat("Lights", categories[-1], 0)
         self.triangle_count = Stat("Triangles", categories[-1], 0, string_func=triangle_count_to_string)
+        self.mesh_count = Stat("Meshes", categories[-1], 0)
+        self.mesh_memory = Stat("Mesh Memory", categories[-1], 0, smaller_is_better, mesh_memory_to_string)
+        self.smoke_grids_reused = Stat("Reused Smoke Grids", categories[-1], 0)
         self.vram = Stat("VRAM", categories[-1], (0, 0), vram_better, vram_usage_to_string)
         categories.append("Settings")
         self.render_engine = Stat("Engine", categories[-1], "?")
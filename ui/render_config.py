@@ -288,6 +288,29 @@ class LUXCORE_RENDER_PT_filesaver(RenderButtonsPanel, Panel):
         col = layout.column(align=True)    
         col.prop(config, "filesaver_format")
         col.prop(config, "filesaver_path")
+
+
+class LUXCORE_RENDER_PT_mesh_cache(RenderButtonsPanel, Panel):
+    COMPAT_ENGINES = {"LUXCORE"}
+    bl_label = "LuxCore Mesh Cache"
+    bl_options = {'DEFAULT_CLOSED'}
+    bl_order = 101
+
+    def draw_header(self, context):
+        layout = self.layout
+        config = context.scene.luxcore.config
+        layout.prop(config, "use_mesh_cache", text="")
+
+    def draw(self, context):
+        layout = self.layout
+        config = context.scene.luxcore.config
+
+        layout.use_property_split = True
+        layout.use_property_decorate = False
+
+        layout.enabled = config.use_mesh_cache
+        layout.label(text="Re-use unchanged meshes in final renders", icon=icons.INFO)
+        layout.prop(config, "mesh_cache_path")
         
         
 
@@ -42,9 +42,9 @@ class LUXCORE_RENDER_PT_error_log(RenderButtonsPanel, Panel):
 
             text = elem.message
             if elem.count > 1:
-                text += str(elem.count) + "x"
+                text += " (%dx)" % elem.count
 
-            row.label(text=elem.message, icon=icon)
+            row.label(text=text, icon=icon)
             if elem.obj_name:
                 op = row.operator("luxcore.select_object", text="", icon=icons.OBJECT)
                 op.obj_name = elem.obj_name
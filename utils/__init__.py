@@ -4,10 +4,14 @@ import math
 import re
 import os
 import hashlib
+import numpy as np
+from array import array
 from ..bin import pyluxcore
 from . import view_layer
 
 NON_DEFORMING_MODIFIERS = {"COLLISION", "PARTICLE_INSTANCE", "PARTICLE_SYSTEM", "SMOKE"}
+# Added to the diagonal of non-invertible matrices (LuxCore can't handle them)
+SINGULAR_MATRIX_EPSILON = 1e-5
 
 
 def sanitize_luxcore_name(string):
@@ -33,7 +37,7 @@ def make_key_from_bpy_struct(bpy_struct):
 
 
 def make_key_from_instance(dg_obj_instance):
-    # TODO optimize, since this will be used for particles as well
+    # Note: in loops over many instances, use InstanceKeyCache instead
     if dg_obj_instance.is_instance:
         key = make_key(dg_obj_instance.object.original)
         key += "_" + make_key(dg_obj_instance.parent.original)
@@ -93,7 +97,10 @@ def make_object_id(dg_obj_instance):
     chosen_id = dg_obj_instance.object.original.luxcore.id
     if chosen_id != -1:
         return chosen_id
+    return _hash_object_id(dg_obj_instance)
 
+
+def _hash_object_id(dg_obj_instance):
     key = dg_obj_instance.object.original.name
 
     if dg_obj_instance.is_instance:
@@ -110,6 +117,55 @@ def make_object_id(dg_obj_instance):
     return min(as_int & 0xffffffff, 0xffffffff - 1)
 
 
+class InstanceKeyCache:
+    """
+    Memoizes the keys (see make_key_from_instance) and object IDs (see make_object_id)
+    of depsgraph object instances. Instances are identified by a tuple of pointers, names and
+    the persistent ID, which is much cheaper to build than the key string or the md5 hash.
+    The names are part of the identity because the object ID is a hash of them, so renamed
+    objects and re-used pointers get a new entry. Cleared when a session is created.
+    """
+    def __init__(self):
+        # {identity: index into the tables below}
+        self._indices = {}
+        self._keys = []
+        self._object_ids = array("I")
+
+    def clear(self):
+        self._indices.clear()
+        self._keys.clear()
+        self._object_ids = array("I")
+
+    def _get_index(self, dg_obj_instance):
+        obj = dg_obj_instance.object.original
+        if dg_obj_instance.is_instance:
+            parent = dg_obj_instance.parent.original
+            identity = (obj.as_pointer(), obj.name,
+                        parent.as_pointer(), parent.name,
+                        tuple(dg_obj_instance.persistent_id))
+        else:
+            identity = (obj.as_pointer(), obj.name)
+
+        try:
+            return self._indices[identity]
+        except KeyError:
+            index = len(self._keys)
+            self._keys.append(make_key_from_instance(dg_obj_instance))
+            self._object_ids.append(_hash_object_id(dg_obj_instance))
+            self._indices[identity] = index
+            return index
+
+    def get_key(self, dg_obj_instance):
+        return self._keys[self._get_index(dg_obj_instance)]
+
+    def get_object_id(self, dg_obj_instance):
+        # The user-chosen ID can change at any time, so it is not memoized
+        chosen_id = dg_obj_instance.object.original.luxcore.id
+        if chosen_id != -1:
+            return chosen_id
+        return self._object_ids[self._get_index(dg_obj_instance)]
+
+
 def create_props(prefix, definitions):
     """
     :param prefix: string, will be prepended to each key part of the definitions.
@@ -125,6 +181,66 @@ def create_props(prefix, definitions):
     return props
 
 
+def create_props_bulk(prefix, definitions):
+    """
+    Like create_props(), but the properties are created with one SetFromString() call
+    instead of one pyluxcore.Property per definition.
+    """
+    builder = PropertyBuilder()
+    builder.add_definitions(prefix, definitions)
+    return builder.get_props()
+
+
+class PropertyBuilder:
+    """
+    Collects many property definitions as text and creates the pyluxcore.Properties in one
+    SetFromString() call, which avoids creating a pyluxcore.Property object per key.
+    Meant for exports of many objects. Values that can't be represented safely as text
+    (e.g. strings with quotes or backslashes) are set as regular properties.
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._props = pyluxcore.Properties()
+
+    def add(self, key, value):
+        try:
+            self._lines.append(key + " = " + _format_property_value(value))
+        except TypeError:
+            self._props.Set(pyluxcore.Property(key, value))
+
+    def add_definitions(self, prefix, definitions):
+        for k, v in definitions.items():
+            self.add(prefix + k, v)
+
+    def get_props(self):
+        props = pyluxcore.Properties()
+        if self._lines:
+            props.SetFromString("\n".join(self._lines))
+        props.Set(self._props)
+        return props
+
+
+def _format_property_value(value):
+    """ Format a value for SetFromString(), raises TypeError if this is not possible """
+    value_type = type(value)
+
+    if value_type is bool:
+        return "1" if value else "0"
+    elif value_type is float or value_type is int:
+        return repr(value)
+    elif value_type is str:
+        if '"' in value or "\\" in value or "\n" in value:
+            raise TypeError("String can't be represented as text")
+        return '"' + value + '"'
+    elif value_type is list or value_type is tuple:
+        if not value:
+            raise TypeError("Empty list can't be represented as text")
+        return " ".join([_format_property_value(elem) for elem in value])
+    else:
+        raise TypeError("Unsupported type " + str(value_type))
+
+
 def get_worldscale(scene, as_scalematrix=True):
     # TODO 2.8 I want to change the way we handle unit scaling, see
     #  https://github.com/LuxCoreRender/BlendLuxCore/issues/97
@@ -180,19 +296,34 @@ def matrix_to_list(matrix, scene=None, apply_worldscale=False, invert=False):
         matrix = matrix.copy()
         matrix.invert_safe()
 
-    l = [matrix[0][0], matrix[1][0], matrix[2][0], matrix[3][0],
-         matrix[0][1], matrix[1][1], matrix[2][1], matrix[3][1],
-         matrix[0][2], matrix[1][2], matrix[2][2], matrix[3][2],
-         matrix[0][3], matrix[1][3], matrix[2][3], matrix[3][3]]
-
     if matrix.determinant() == 0:
         # The matrix is non-invertible. This can happen if e.g. the scale on one axis is 0.
-        # Prevent a RuntimeError from LuxCore by adding a small random epsilon.
-        # TODO maybe look for a better way to handle this
-        from random import random
-        return [float(i) + (1e-5 + random() * 1e-5) for i in l]
-    else:
-        return [float(i) for i in l]
+        # Prevent a RuntimeError from LuxCore by adding a small epsilon.
+        # The epsilon is always the same, so repeated exports produce the same scene.
+        matrix = matrix.copy()
+        for i in range(4):
+            matrix[i][i] += SINGULAR_MATRIX_EPSILON
+
+    # LuxCore expects the matrix in column-major order
+    return [value for column in matrix.col for value in column]
+
+
+def matrices_to_array(matrices, dtype=np.float64):
+    """
+    Batched version of matrix_to_list() for many transformations at once.
+    matrices can be a sequence of mathutils.Matrix or an array that can be reshaped to (N, 4, 4),
+    with the rows of each matrix first (the layout of numpy.array(matrix)).
+    Returns an array of shape (N, 16), each row is one matrix in the order LuxCore expects.
+    Like in matrix_to_list(), non-invertible matrices are fixed with SINGULAR_MATRIX_EPSILON.
+    """
+    matrices = np.array(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
+    singular = np.linalg.det(matrices) == 0
+    if singular.any():
+        matrices[singular] += np.identity(4) * SINGULAR_MATRIX_EPSILON
+
+    # Transpose to column-major order
+    return matrices.transpose(0, 2, 1).reshape(-1, 16).astype(dtype)
 
 
 def calc_filmsize_raw(scene, context=None):
@@ -568,6 +699,45 @@ def use_filesaver(context, scene):
     return context is None and scene.luxcore.config.use_filesaver
 
 
+# Number of depsgraph_update_post events (see handlers/depsgraph_update_post.py).
+# Every property change in Blender, including LuxCore properties, leads to such an event.
+_depsgraph_update_count = 0
+
+
+def count_depsgraph_update():
+    global _depsgraph_update_count
+    _depsgraph_update_count += 1
+
+
+def get_scene_fingerprint(scene):
+    """
+    Cheap replacement for a hash of all properties that can affect the export.
+    If it is equal to the fingerprint of an earlier call, nothing was changed in between.
+    """
+    return _depsgraph_update_count, scene.frame_current, scene.frame_subframe
+
+
+def get_view_fingerprint(scene, context):
+    """
+    Like get_scene_fingerprint(), but also covers the viewport settings, which can
+    change without a depsgraph update (e.g. when navigating or resizing the viewport).
+    """
+    region = context.region
+    region_data = context.region_data
+    space_data = context.space_data
+    return (get_scene_fingerprint(scene),
+            region.width, region.height,
+            region_data.view_perspective,
+            region_data.view_matrix.copy(),
+            region_data.view_distance,
+            region_data.view_camera_zoom,
+            tuple(region_data.view_camera_offset),
+            space_data.lens,
+            space_data.use_render_border,
+            space_data.render_border_min_x, space_data.render_border_min_y,
+            space_data.render_border_max_x, space_data.render_border_max_y)
+
+
 # TODO 2.8 remove
 def get_current_render_layer(scene):
     raise NotImplementedError("use the new method in view_layer.py")
@@ -605,11 +775,17 @@ def is_opencl_build():
     return not pyluxcore.GetPlatformDesc().Get("compile.LUXRAYS_DISABLE_OPENCL").GetBool()
 
 
+# Index of all image sequences in a directory, built with one directory scan
+# {basedir: (mtime_ns, {(filename_nodigits, ext): [(index, filepath), ...]})}
+_image_sequence_indices = {}
+
+
 def image_sequence_resolve_all(image):
     """
     From https://blender.stackexchange.com/a/21093/29401
     Returns a list of tuples: (index, filepath)
     index is the frame number, parsed from the filepath
+    The returned list is shared with other callers and must not be modified.
     """
     filepath = get_abspath(image.filepath, image.library)
     basedir, filename = os.path.split(filepath)
@@ -624,18 +800,43 @@ def image_sequence_resolve_all(image):
         # Input isn't from a sequence
         return []
 
-    indexed_filepaths = []
+    sequences = _get_image_sequence_index(basedir, digits)
+    return sequences.get((filename_nodigits, ext), [])
+
+
+def _get_image_sequence_index(basedir, digits):
+    """
+    Scanning the directory is slow on network storage with many frames, so the index is
+    re-used by all sequences in the directory until the directory is modified
+    (adding, removing or renaming files changes the mtime of the directory).
+    """
+    mtime = os.stat(basedir).st_mtime_ns
+
+    try:
+        cached_mtime, sequences = _image_sequence_indices[basedir]
+        if cached_mtime == mtime:
+            return sequences
+    except KeyError:
+        pass
+
+    sequences = {}
     for f in os.scandir(basedir):
-        index_str = f.name[len(filename_nodigits):-len(ext) if ext else -1]
+        if not f.is_file():
+            continue
+
+        name_noext, ext = os.path.splitext(f.name)
+        name_nodigits = name_noext.rstrip(digits)
+        index_str = name_noext[len(name_nodigits):]
 
-        if (f.is_file()
-                and f.name.startswith(filename_nodigits)
-                and f.name.endswith(ext)
-                and index_str.isdigit()):
+        if index_str:
             elem = (int(index_str), f.path)
-            indexed_filepaths.append(elem)
+            sequences.setdefault((name_nodigits, ext), []).append(elem)
+
+    for indexed_filepaths in sequences.values():
+        indexed_filepaths.sort(key=lambda elem: elem[0])
 
-    return sorted(indexed_filepaths, key=lambda elem: elem[0])
+    _image_sequence_indices[basedir] = (mtime, sequences)
+    return sequences
 
 
 def is_valid_camera(obj):
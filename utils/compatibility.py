@@ -1,5 +1,5 @@
 import bpy
-from .node import find_nodes
+from .node import group_nodes_by_type
 
 
 """
@@ -8,33 +8,65 @@ e.g. replace old nodes with updated ones when socket names change.
 """
 
 
+# Each datablock stores the version of the last migration that was applied to it.
+# The name starts with an underscore so Blender does not show it in the custom properties panel.
+VERSION_KEY = "_luxcore_compatibility_version"
+
+# Datablocks that are known to be up to date in this session, as (pointer, name_full) tuples.
+# Datablocks that were appended or linked since the last run are found by set difference.
+# The name is part of the key because memory addresses can be re-used after undo.
+_checked_node_trees = set()
+_checked_scenes = set()
+
+
 def run():
-    for node_tree in bpy.data.node_groups:
-        update_output_nodes_volume_change(node_tree)
-        update_glossy_nodes_ior_change(node_tree)
-        update_volume_nodes_asymmetry_change(node_tree)
-        update_smoke_nodes_add_color_output(node_tree)
-        update_colormix_remove_min_max_sockets(node_tree)
-        update_imagemap_remove_gamma_brightness_sockets(node_tree)
-        update_cloth_remove_repeat_sockets(node_tree)
-        update_imagemap_add_alpha_output(node_tree)
-
-    for scene in bpy.data.scenes:
-        config = scene.luxcore.config
-        # Reworked after v2.2beta4, DLSC is no longer part of the light strategy enum, but a separate checkbox.
-        # Commit: 87ef293cdac2011da28365941414f88ff2658903
-        if config.light_strategy == "":
-            # It was probably DLS_CACHE. We have no way to find out,
-            # but that is the only entry that was ever removed.
-            # Restore the default here and enable the new DLSC BoolProperty
-            config.light_strategy = "LOG_POWER"
-            config.dls_cache.enabled = True
-
-
-def update_output_nodes_volume_change(node_tree):
+    _run_migrations(bpy.data.node_groups, _checked_node_trees, NODE_TREE_MIGRATIONS, _migrate_node_tree)
+    _run_migrations(bpy.data.scenes, _checked_scenes, SCENE_MIGRATIONS, _migrate_scene)
+
+
+def reset():
+    """ Forget which datablocks were already checked, has to be called when a .blend file is loaded """
+    _checked_node_trees.clear()
+    _checked_scenes.clear()
+
+
+def _run_migrations(datablocks, checked, migrations, migrate_func):
+    keys = {(datablock.as_pointer(), datablock.name_full): datablock for datablock in datablocks}
+    new_keys = keys.keys() - checked
+    latest_version = migrations[-1][0]
+
+    for key in new_keys:
+        datablock = keys[key]
+        version = datablock.get(VERSION_KEY, 0)
+
+        if version < latest_version:
+            migrate_func(datablock, [func for func_version, func in migrations if func_version > version])
+
+            if not datablock.library:
+                # Linked datablocks can't store the version, they are migrated again in each session
+                datablock[VERSION_KEY] = latest_version
+
+    checked.clear()
+    checked.update(keys.keys())
+
+
+def _migrate_node_tree(node_tree, migrations):
+    # Walk the nodes only once, all node trees are visited so pointer nodes don't have to be followed.
+    # Note that the output node update replaces output nodes, so they must not be looked up afterwards.
+    nodes = group_nodes_by_type(node_tree)
+    for func in migrations:
+        func(node_tree, nodes)
+
+
+def _migrate_scene(scene, migrations):
+    for func in migrations:
+        func(scene)
+
+
+def update_output_nodes_volume_change(node_tree, nodes):
     # commit 3078719a9a33a7e2a798965294463dce6c8b7749
 
-    for old_output in find_nodes(node_tree, "LuxCoreNodeMatOutput"):
+    for old_output in nodes.get("LuxCoreNodeMatOutput", []):
         if "Interior Volume" in old_output.inputs:
             continue
 
@@ -69,11 +101,10 @@ def update_output_nodes_volume_change(node_tree):
         node_tree.nodes.remove(old_output)
 
 
-def update_glossy_nodes_ior_change(node_tree):
+def update_glossy_nodes_ior_change(node_tree, nodes):
     # commit c3152dec8e0e07e676a60be56ba4578dbe297df6
 
-    affected_nodes = find_nodes(node_tree, "LuxCoreNodeMatGlossy2")
-    affected_nodes += find_nodes(node_tree, "LuxCoreNodeMatGlossyCoating")
+    affected_nodes = nodes.get("LuxCoreNodeMatGlossy2", []) + nodes.get("LuxCoreNodeMatGlossyCoating", [])
 
     for node in affected_nodes:
         if "IOR" not in node.inputs:
@@ -83,14 +114,13 @@ def update_glossy_nodes_ior_change(node_tree):
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_volume_nodes_asymmetry_change(node_tree):
+def update_volume_nodes_asymmetry_change(node_tree, nodes):
     # commit 2387d1c300b5a1f6931592efcdd0574d243356e7
 
     if node_tree.bl_idname != "luxcore_volume_nodes":
         return
 
-    affected_nodes = find_nodes(node_tree, "LuxCoreNodeVolHeterogeneous")
-    affected_nodes += find_nodes(node_tree, "LuxCoreNodeVolHomogeneous")
+    affected_nodes = nodes.get("LuxCoreNodeVolHeterogeneous", []) + nodes.get("LuxCoreNodeVolHomogeneous", [])
 
     for node in affected_nodes:
         asymmetry_socket = node.inputs["Asymmetry"]
@@ -100,23 +130,23 @@ def update_volume_nodes_asymmetry_change(node_tree):
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_smoke_nodes_add_color_output(node_tree):
+def update_smoke_nodes_add_color_output(node_tree, nodes):
     # commit f31f3be5409df9866c9b7364ce79e8e7aee0e875
 
     if node_tree.bl_idname != "luxcore_volume_nodes":
         return
 
-    for node in find_nodes(node_tree, "LuxCoreNodeTexSmoke"):
+    for node in nodes.get("LuxCoreNodeTexSmoke", []):
         if "Color" not in node.outputs:
             color = node.outputs.new("LuxCoreSocketColor", "Color")
             color.enabled = False
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_colormix_remove_min_max_sockets(node_tree):
+def update_colormix_remove_min_max_sockets(node_tree, nodes):
     # commit 432b1ba020b07f46758fd19b4b3af91cca0c90ff
 
-    for node in find_nodes(node_tree, "LuxCoreNodeTexColorMix"):
+    for node in nodes.get("LuxCoreNodeTexColorMix", []):
         if node.mode == "clamp" and "Min" in node.inputs and "Max" in node.inputs:
             socket_min = node.inputs["Min"]
             socket_max = node.inputs["Max"]
@@ -127,10 +157,10 @@ def update_colormix_remove_min_max_sockets(node_tree):
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_imagemap_remove_gamma_brightness_sockets(node_tree):
+def update_imagemap_remove_gamma_brightness_sockets(node_tree, nodes):
     # commit 428110b2c1bdbf8c54a54030939b3c76cb018644
 
-    for node in find_nodes(node_tree, "LuxCoreNodeTexImagemap"):
+    for node in nodes.get("LuxCoreNodeTexImagemap", []):
         updated = False
         if "Gamma" in node.inputs:
             socket_gamma = node.inputs["Gamma"]
@@ -148,10 +178,10 @@ def update_imagemap_remove_gamma_brightness_sockets(node_tree):
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_cloth_remove_repeat_sockets(node_tree):
+def update_cloth_remove_repeat_sockets(node_tree, nodes):
     # commit ec3fccdccb3e4c95a4230df8b38f6494bb8e4583
 
-    for node in find_nodes(node_tree, "LuxCoreNodeMatCloth"):
+    for node in nodes.get("LuxCoreNodeMatCloth", []):
         if "Repeat U" in node.inputs and "Repeat V" in node.inputs:
             socket_repeat_u = node.inputs["Repeat U"]
             socket_repeat_v = node.inputs["Repeat V"]
@@ -162,10 +192,40 @@ def update_cloth_remove_repeat_sockets(node_tree):
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
 
 
-def update_imagemap_add_alpha_output(node_tree):
+def update_imagemap_add_alpha_output(node_tree, nodes):
     # commit 09f23b0d758bce9383a0fa8c64ccbeb73706bccf
 
-    for node in find_nodes(node_tree, "LuxCoreNodeTexImagemap"):
+    for node in nodes.get("LuxCoreNodeTexImagemap", []):
         if "Alpha" not in node.outputs:
             node.outputs.new("LuxCoreSocketFloatUnbounded", "Alpha")
             print('Updated %s node "%s" in tree "%s" to new version' % (node.bl_idname, node.name, node_tree.name))
+
+
+def update_dls_cache_light_strategy(scene):
+    # Reworked after v2.2beta4, DLSC is no longer part of the light strategy enum, but a separate checkbox.
+    # Commit: 87ef293cdac2011da28365941414f88ff2658903
+    config = scene.luxcore.config
+    if config.light_strategy == "":
+        # It was probably DLS_CACHE. We have no way to find out,
+        # but that is the only entry that was ever removed.
+        # Restore the default here and enable the new DLSC BoolProperty
+        config.light_strategy = "LOG_POWER"
+        config.dls_cache.enabled = True
+
+
+# (version, function) pairs in the order they have to be applied.
+# To add a migration, append it with the next higher version number, never change existing numbers.
+NODE_TREE_MIGRATIONS = [
+    (1, update_output_nodes_volume_change),
+    (2, update_glossy_nodes_ior_change),
+    (3, update_volume_nodes_asymmetry_change),
+    (4, update_smoke_nodes_add_color_output),
+    (5, update_colormix_remove_min_max_sockets),
+    (6, update_imagemap_remove_gamma_brightness_sockets),
+    (7, update_cloth_remove_repeat_sockets),
+    (8, update_imagemap_add_alpha_output),
+]
+
+SCENE_MIGRATIONS = [
+    (1, update_dls_cache_light_strategy),
+]
@@ -1,6 +1,16 @@
 import bpy
+import threading
+from time import time
 from . import ui as utils_ui
 
+# Minimum time between two redraws of the error log panel, in seconds
+UI_UPDATE_INTERVAL = 0.25
+# If more objects report the same message, they are combined into one entry without object
+MAX_OBJECTS_PER_MESSAGE = 10
+
+_last_ui_update = 0
+_ui_update_scheduled = False
+
 
 def update_ui():
     try:
@@ -12,6 +22,36 @@ def update_ui():
         pass
 
 
+def update_ui_rate_limited():
+    """
+    Like update_ui(), but the redraws are limited to one per UI_UPDATE_INTERVAL.
+    If the last redraw was too recent, another one is scheduled so the latest state is always shown.
+    Timers are not thread-safe and never run in background mode, so from other threads
+    (e.g. the final render export) and in background mode, too frequent redraws are skipped.
+    """
+    global _last_ui_update, _ui_update_scheduled
+
+    if _ui_update_scheduled:
+        return
+
+    remaining = _last_ui_update + UI_UPDATE_INTERVAL - time()
+    if remaining <= 0:
+        _last_ui_update = time()
+        update_ui()
+    elif threading.current_thread() is threading.main_thread() and not bpy.app.background:
+        _ui_update_scheduled = True
+        bpy.app.timers.register(_scheduled_ui_update, first_interval=remaining)
+
+
+def _scheduled_ui_update():
+    global _last_ui_update, _ui_update_scheduled
+    _ui_update_scheduled = False
+    _last_ui_update = time()
+    update_ui()
+    # Don't repeat the timer
+    return None
+
+
 class LuxCoreError:
     def __init__(self, message, obj_name):
         self.message = str(message)
@@ -30,30 +70,52 @@ class LuxCoreErrorLog:
     """
     errors = []
     warnings = []
+    # Used to find already logged messages: {(message, obj_name): LuxCoreError}
+    _error_lookup = {}
+    _warning_lookup = {}
+    # Number of entries with object per message: {(prefix, message): count}
+    _object_counts = {}
 
     @classmethod
     def add_error(cls, message, obj_name=""):
-        cls._add("ERROR:", cls.errors, message, obj_name)
+        cls._add("ERROR:", cls.errors, cls._error_lookup, message, obj_name)
 
     @classmethod
     def add_warning(cls, message, obj_name=""):
-        cls._add("WARNING:", cls.warnings, message, obj_name)
+        cls._add("WARNING:", cls.warnings, cls._warning_lookup, message, obj_name)
 
     @classmethod
     def clear(cls):
         cls.errors.clear()
         cls.warnings.clear()
+        cls._error_lookup.clear()
+        cls._warning_lookup.clear()
+        cls._object_counts.clear()
         update_ui()
 
     @classmethod
-    def _add(cls, prefix, collection, message, obj_name):
-        for elem in collection:
-            if elem.message == message and elem.obj_name == obj_name:
-                elem.count += 1
-                # print("Error or warning already logged. Abort adding to collection.")
+    def _add(cls, prefix, collection, lookup, message, obj_name):
+        message = str(message)
+        key = (message, obj_name)
+
+        try:
+            lookup[key].count += 1
+            # print("Error or warning already logged. Abort adding to collection.")
+            return
+        except KeyError:
+            pass
+
+        if obj_name:
+            # Keep the list short if many objects report the same problem,
+            # the objects after the first few are only counted
+            object_count = cls._object_counts.get((prefix, message), 0)
+            if object_count >= MAX_OBJECTS_PER_MESSAGE:
+                cls._add(prefix, collection, lookup, message, "")
                 return
+            cls._object_counts[(prefix, message)] = object_count + 1
 
         print(prefix, message)
         new = LuxCoreError(message, obj_name)
         collection.append(new)
-        update_ui()
+        lookup[key] = new
+        update_ui_rate_limited()
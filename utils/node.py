@@ -1,6 +1,7 @@
+import bpy
 import mathutils
 from ..bin import pyluxcore
-from . import find_active_uv
+from . import find_active_uv, make_key
 from .errorlog import LuxCoreErrorLog
 from ..ui import icons
 
@@ -148,6 +149,118 @@ def find_nodes(node_tree, bl_idname):
     return result
 
 
+def group_nodes_by_type(node_tree):
+    """
+    Returns a dictionary {bl_idname: [node, ...]} of the nodes in this node tree.
+    Pointer nodes are not followed.
+    """
+    result = {}
+    for node in node_tree.nodes:
+        result.setdefault(node.bl_idname, []).append(node)
+    return result
+
+
+class NodeTreeInfo:
+    """ Summary of a node tree, including all node trees referenced by pointer nodes """
+    __slots__ = ("node_counts", "dependencies")
+
+    def __init__(self):
+        # {bl_idname: count}
+        self.node_counts = {}
+        # Keys of all node trees that are reachable through pointer nodes
+        self.dependencies = set()
+
+    def count(self, bl_idname):
+        return self.node_counts.get(bl_idname, 0)
+
+    @property
+    def uses_pointiness(self):
+        # Better check would be if the node is linked
+        return self.count("LuxCoreNodeTexPointiness") > 0
+
+    @property
+    def imagemap_count(self):
+        return self.count("LuxCoreNodeTexImagemap")
+
+    @property
+    def needs_uv_map(self):
+        return self.imagemap_count > 0
+
+
+class NodeTreeIndex:
+    """
+    Caches a NodeTreeInfo for each node tree, so per-object checks like "does the
+    material use pointiness" don't have to walk all nodes and pointer trees again.
+    Entries are built on first access. They are invalidated when the structure of a
+    node tree or one of its pointer trees changes (see LuxCoreNodeTree.update and
+    depsgraph updates), and the whole index is cleared at the start of each export.
+    """
+
+    def __init__(self):
+        # {node_tree_key: NodeTreeInfo}
+        self._entries = {}
+
+    def get(self, node_tree):
+        try:
+            return self._entries[make_key(node_tree)]
+        except KeyError:
+            return self._build(node_tree, [])
+
+    def invalidate(self, node_tree):
+        key = make_key(node_tree)
+        self._entries = {entry_key: info for entry_key, info in self._entries.items()
+                         if entry_key != key and key not in info.dependencies}
+
+    def update(self, depsgraph):
+        if not depsgraph.id_type_updated("NODETREE"):
+            return
+
+        for dg_update in depsgraph.updates:
+            if isinstance(dg_update.id, bpy.types.NodeTree):
+                self.invalidate(dg_update.id)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _build(self, node_tree, stack):
+        key = make_key(node_tree)
+        info = NodeTreeInfo()
+        counts = info.node_counts
+        stack.append(key)
+
+        for node in node_tree.nodes:
+            bl_idname = node.bl_idname
+            counts[bl_idname] = counts.get(bl_idname, 0) + 1
+
+            if bl_idname == "LuxCoreNodeTreePointer" and node.node_tree:
+                pointer_key = make_key(node.node_tree)
+                if pointer_key in stack:
+                    msg = (f'Pointer nodes in node trees "{node_tree.name}" and "{node.node_tree.name}" '
+                           "create a dependency cycle! Delete one of them.")
+                    LuxCoreErrorLog.add_error(msg)
+                    # Mark the faulty nodes in red
+                    node.use_custom_color = True
+                    node.color = (0.9, 0, 0)
+                    continue
+
+                pointer_info = self._entries.get(pointer_key)
+                if pointer_info is None:
+                    pointer_info = self._build(node.node_tree, stack)
+
+                for pointer_bl_idname, count in pointer_info.node_counts.items():
+                    counts[pointer_bl_idname] = counts.get(pointer_bl_idname, 0) + count
+                info.dependencies.add(pointer_key)
+                info.dependencies |= pointer_info.dependencies
+
+        stack.pop()
+        self._entries[key] = info
+        return info
+
+
+# Shared by all exporters and invalidated by node tree update callbacks
+tree_index = NodeTreeIndex()
+
+
 def force_viewport_update(_, context):
     """
     Since Blender 2.80, properties on custom sockets and custom nodes are not listed
@@ -1,4 +1,5 @@
 import numpy as np
+import os
 import re
 import sys
 
@@ -75,3 +76,78 @@ def save_pfm(file, image, scale=1):
     file.write(b"%f\n" % scale)
 
     image.tofile(file)
+
+
+def create_pfm_mmap(path, width, height, color=True):
+    """
+    Create a little-endian PFM file with pre-written header and map its pixel data
+    into memory. The returned array (shape H x W x 3 or H x W) can be filled directly,
+    e.g. by GetOutputFloat(), without writing a copy to disk. Call flush() on it
+    to make sure other processes see the data.
+    Raises OSError if the space can't be reserved (e.g. a full tmpfs), writing
+    to a sparse mapping would crash the process with SIGBUS instead.
+
+    Usage:
+    data = create_pfm_mmap(r"/path/to/out.pfm", width, height)
+    film.GetOutputFloat(output_type, data)
+    data.flush()
+    """
+    header = b"%s\n%d %d\n%f\n" % (b"PF" if color else b"Pf", width, height, -1.0)
+    shape = (height, width, 3) if color else (height, width)
+
+    size = len(header) + int(np.prod(shape)) * 4
+    try:
+        with open(path, "wb") as f:
+            f.write(header)
+            # Reserve the space for the pixel data
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+    except OSError:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return np.memmap(path, dtype="<f4", mode="r+", offset=len(header), shape=shape)
+
+
+def load_pfm_mmap(path, as_flat_list=False):
+    """
+    Like load_pfm(), but the pixel data is mapped into memory instead of read
+    into a new array. Returns a tuple containing the read-only image and the
+    scale factor from the file. The file can't be deleted on Windows while the
+    returned array is alive.
+
+    Usage:
+    data, scale = load_pfm_mmap(r"path/to/file.pfm")
+    """
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").rstrip()
+        if header == "PF":
+            color = True
+        elif header == "Pf":
+            color = False
+        else:
+            raise Exception("Not a PFM file.")
+
+        dim_match = re.match(r"^(\d+)\s(\d+)\s$", f.readline().decode("utf-8"))
+        if dim_match:
+            width, height = map(int, dim_match.groups())
+        else:
+            raise Exception("Malformed PFM header.")
+
+        scale = float(f.readline().decode("utf-8").rstrip())
+        offset = f.tell()
+
+    if scale < 0:  # little-endian
+        endian = "<"
+        scale = -scale
+    else:
+        endian = ">"  # big-endian
+
+    shape = (height, width, 3) if color else (height, width)
+    if as_flat_list:
+        shape = (int(np.prod(shape)),)
+    data = np.memmap(path, dtype=endian + "f", mode="r", offset=offset, shape=shape)
+    return data, scale
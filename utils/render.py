@@ -4,6 +4,7 @@ from ..handlers.draw_imageeditor import TileStats
 from ..properties.statistics import (
     samples_per_sec_to_string,
     triangle_count_to_string,
+    mesh_memory_to_string,
     convergence_to_string,
     rays_per_sample_to_string,
     get_rays_per_sample,
@@ -128,7 +129,8 @@ def update_status_msg(stats, engine, scene, config, time_until_film_refresh):
         TileStats.notconverged_passcounts = stats.Get('stats.tilepath.tiles.notconverged.pass').GetInts()
 
 
-def get_pretty_stats(config, stats, scene, context=None):
+def get_pretty_stats(config, stats, scene, context=None, mesh_stats=None):
+    """ mesh_stats: optional (count, triangles, memory) tuple of the exported meshes, see ObjectCache2 """
     halt = utils.get_halt_conditions(scene)
 
     # Here we collect strings in a list and later join them
@@ -183,6 +185,12 @@ def get_pretty_stats(config, stats, scene, context=None):
     triangle_count = stats.Get("stats.dataset.trianglecount").GetUnsignedLongLong()
     pretty.append(triangle_count_to_string(triangle_count) + " Tris")
 
+    # Geometry footprint of the exported meshes, shows if edits free the old meshes
+    if mesh_stats:
+        mesh_count, _, mesh_memory = mesh_stats
+        mesh_str = "Mesh" if mesh_count == 1 else "Meshes"
+        pretty.append("%d %s (%s)" % (mesh_count, mesh_str, mesh_memory_to_string(mesh_memory)))
+
     # Errors and warnings
     error_str = ""
 